@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import glob
+import json
+import time
+import pickle
+import argparse
+import resource
+import multiprocessing
+import numpy as np
+import dpll
+import datautil
+import satutil
+import certificates
+import tracer
+from fanSATstic import RunStats, var_selection_heuristics, restart_policies
+from fanSATstic import MOST_OFTEN, NO_RESTARTS
+from fanSATstic import writeTrace
+from rl_agent import GreedyPolicy
+
+
+__description__ = 'Solves many cnf files in parallel and writes one json ' \
+                  'line per instance'
+
+# Instance status
+SAT = 'SAT'
+UNSAT = 'UNSAT'
+TIMEOUT = 'TIMEOUT'
+MEMOUT = 'MEMOUT'
+ERROR = 'ERROR'
+
+# Seconds between checks of the running solvers
+POLL_INTERVAL = 0.05
+
+# Satisfiable results whose models are verified together
+VERIFY_BATCH = 64
+
+
+#
+#
+def collectInstances(inputs, manifest=None):
+    """
+    Returns the sorted list of cnf files given by inputs and the manifest
+
+        - inputs: Files, directories (every file inside them) or glob
+                  patterns
+        - manifest: File with one path per line, relative paths are taken
+                    from the manifest directory. Empty lines and lines
+                    starting with # are skipped
+    """
+    instances = set()
+
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            instances.update(f for f in glob.glob(os.path.join(pattern, '*'))
+                             if os.path.isfile(f))
+        else:
+            instances.update(f for f in glob.glob(pattern)
+                             if os.path.isfile(f))
+
+    if manifest is not None:
+        base = os.path.dirname(manifest)
+        with open(manifest) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    instances.add(os.path.join(base, line))
+
+    return sorted(instances)
+
+
+#
+#
+def solveInstance(fname, options, conn):
+    """
+    Solves fname in a child process and sends the result dictionary
+    through conn
+    """
+    if options.mem_limit is not None:
+        limit = options.mem_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    result = {'instance': fname}
+    start = time.time()
+
+    try:
+        num_vars, clauses = datautil.parseCNF(fname)
+
+        if options.policy is not None:
+            with open(options.policy, 'rb') as f:
+                heuristic = GreedyPolicy(pickle.load(f))
+        else:
+            heuristic = var_selection_heuristics[options.vselection]
+
+        proof = None
+        if options.proofs is not None:
+            result['proof'] = proofPath(fname, options)
+            proof = certificates.DratWriter(result['proof'],
+                                            options.binary_proofs)
+
+        search_tracer = None
+        if options.traces is not None:
+            search_tracer = tracer.SearchTracer(options.trace_buffer,
+                                                options.trace_sample)
+
+        run_stats = RunStats()
+        try:
+            sat, model = dpll.solve(num_vars, clauses, heuristic, run_stats,
+                                    restart_policies[options.restarts](
+                                        heuristic),
+                                    options.components,
+                                    options.binary_implications,
+                                    options.at_most_one,
+                                    options.xors,
+                                    pure_literal_depth=options.pure_depth,
+                                    backend=options.backend,
+                                    proof=proof,
+                                    tracer=search_tracer)
+        finally:
+            if proof is not None:
+                proof.close()
+
+        if search_tracer is not None:
+            result['trace'] = os.path.join(options.traces,
+                                           os.path.basename(fname))
+            writeTrace(search_tracer, result['trace'])
+
+        result['status'] = SAT if sat else UNSAT
+
+        # A proof only certifies unsatisfiability
+        if sat and proof is not None:
+            os.remove(result.pop('proof'))
+        result['splits'] = run_stats.n_splits
+        result['restarts'] = run_stats.n_restarts
+
+        # Always sent, solveAll verifies it (see verifyModels)
+        if sat:
+            result['model'] = [v if model[v] else -v
+                               for v in xrange(1, num_vars+1)]
+
+    except MemoryError:
+        result['status'] = MEMOUT
+        result.pop('proof', None)
+        removeProof(fname, options)
+
+    except Exception, e:
+        result['status'] = ERROR
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        result.pop('proof', None)
+        removeProof(fname, options)
+
+    result['time'] = round(time.time() - start, 6)
+    conn.send(result)
+    conn.close()
+
+
+#
+#
+def proofPath(fname, options):
+    """
+    Returns the file of the DRAT proof of fname in options.proofs
+    """
+    return os.path.join(options.proofs, os.path.basename(fname) + '.drat')
+
+#
+#
+def removeProof(fname, options):
+    """
+    Removes the proof of fname left by a solver that did not finish, it
+    would look like a complete one
+    """
+    if options.proofs is None:
+        return
+
+    try:
+        os.remove(proofPath(fname, options))
+    except OSError:
+        pass
+
+
+#
+#
+def verifyModels(results):
+    """
+    Sets result['verified'] in the satisfiable results, checking the model
+    against the instance parsed again, apart from the solver. The models
+    of all the results are checked in one pass
+    """
+    packs = []
+    interpretations = []
+    checked = []
+
+    for result in results:
+        try:
+            num_vars, clauses = datautil.parseCNF(result['instance'])
+        except Exception:
+            result['verified'] = False
+            continue
+
+        model = np.array(result['model'], dtype=np.int64)
+        interpretation = np.zeros(num_vars + 1, dtype=bool)
+        interpretation[model[model > 0]] = True
+
+        packs.append(satutil.packClauses(clauses))
+        interpretations.append(interpretation)
+        checked.append(result)
+
+    for result, verified in zip(checked, satutil.batchSatisfiesEach(
+            packs, interpretations)):
+        result['verified'] = bool(verified)
+
+#
+#
+def solveAll(instances, options, out=sys.stdout):
+    """
+    Solves the instances with at most options.jobs child processes at the
+    same time. Every instance gets its own process, so a solver that runs
+    out of time is killed without affecting the others.
+
+    Writes one json line per instance to out, in completion order, and
+    returns the number of instances of every status. Satisfiable instances
+    are held until VERIFY_BATCH of them are ready or the run ends, their
+    models are verified together
+    """
+    pending = list(reversed(instances))
+    running = []
+    unverified = []
+    summary = {}
+
+    def report(result):
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+        out.write(json.dumps(result, sort_keys=True) + '\n')
+        out.flush()
+
+    def reportVerified():
+        verifyModels(unverified)
+        for result in unverified:
+            if not options.models:
+                del result['model']
+            report(result)
+        del unverified[:]
+
+    def received(result):
+        if result['status'] != SAT:
+            report(result)
+            return
+
+        unverified.append(result)
+        if len(unverified) >= VERIFY_BATCH:
+            reportVerified()
+
+    while pending or running:
+        while pending and len(running) < options.jobs:
+            fname = pending.pop()
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            proc = multiprocessing.Process(target=solveInstance,
+                                           args=(fname, options, child_conn))
+            proc.daemon = True
+            proc.start()
+            child_conn.close()
+            running.append((proc, parent_conn, fname, time.time()))
+
+        still_running = []
+        for proc, conn, fname, start in running:
+            elapsed = time.time() - start
+
+            if conn.poll():
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = {'instance': fname, 'status': ERROR,
+                              'error': 'solver exited with code %s' %
+                                       proc.exitcode,
+                              'time': round(elapsed, 6)}
+                    removeProof(fname, options)
+                proc.join()
+                received(result)
+
+            elif options.timeout is not None and elapsed > options.timeout:
+                proc.terminate()
+                proc.join()
+                removeProof(fname, options)
+                report({'instance': fname, 'status': TIMEOUT,
+                        'time': round(elapsed, 6)})
+
+            elif not proc.is_alive() and not conn.poll():
+                removeProof(fname, options)
+                report({'instance': fname, 'status': ERROR,
+                        'error': 'solver exited with code %s' % proc.exitcode,
+                        'time': round(elapsed, 6)})
+
+            else:
+                still_running.append((proc, conn, fname, start))
+
+        running = still_running
+        if running:
+            time.sleep(POLL_INTERVAL)
+
+    reportVerified()
+
+    return summary
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('inputs', nargs='*',
+                        help='cnf files, directories or glob patterns')
+
+    parser.add_argument('-m', '--manifest', action='store', default=None,
+                        help='File with the path of one cnf file per line')
+
+    parser.add_argument('-j', '--jobs', action='store', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of instances solved at the same time. '
+                        'DEFAULT = number of cpus')
+
+    parser.add_argument('-t', '--timeout', action='store', type=float,
+                        default=None,
+                        help='Seconds before an instance is given up')
+
+    parser.add_argument('-ml', '--mem-limit', action='store', type=int,
+                        default=None,
+                        help='Address space limit of every solver in MB')
+
+    parser.add_argument('-vsh', '--vselection', action='store',
+                        default=MOST_OFTEN,
+                        choices=var_selection_heuristics.keys(),
+                        help='Specifies the variable selection heuristic. '
+                        'DEFAULT = %s' % MOST_OFTEN)
+
+    parser.add_argument('-p', '--policy', action='store', default=None,
+                        help='Agent saved with fanSATstic.py --save-policy. '
+                        'Its greedy choice of heuristic is used instead of '
+                        '--vselection')
+
+    parser.add_argument('-rs', '--restarts', action='store',
+                        default=NO_RESTARTS,
+                        choices=restart_policies.keys(),
+                        help='Specifies the restart schedule. '
+                        'DEFAULT = %s' % NO_RESTARTS)
+
+    parser.add_argument('-cmp', '--components', action='store_true',
+                        help='Split the residual formula into independent '
+                        'components and solve each one on its own')
+
+    parser.add_argument('-bin', '--binary-implications', action='store_true',
+                        help='Propagate the binary clauses through '
+                        'implication lists')
+
+    parser.add_argument('-amo', '--at-most-one', action='store_true',
+                        help='Replace pairwise at-most-one encodings by '
+                        'native constraints. Implies --binary-implications')
+
+    parser.add_argument('-xor', '--xors', action='store_true',
+                        help='Detect xor constraints encoded in the clauses '
+                        'and propagate them with gaussian elimination')
+
+    parser.add_argument('-pd', '--pure-depth', action='store', type=int,
+                        default=None,
+                        help='Only eliminate pure literals up to this number '
+                        'of decisions, 0 restricts it to the root. By '
+                        'default they are eliminated at every node')
+
+    parser.add_argument('-be', '--backend', action='store',
+                        default=dpll.SETS, choices=dpll.BACKENDS,
+                        help='Formula representation of the search, %s only '
+                        'supports plain searches with the fixed heuristics '
+                        'and may split on other variables. %s uses it when '
+                        'it can. DEFAULT = %s' % (dpll.BITSET, dpll.AUTO,
+                                                  dpll.SETS))
+
+    parser.add_argument('--models', action='store_true',
+                        help='Include the model of the satisfiable '
+                        'instances in the output')
+
+    parser.add_argument('-pr', '--proofs', action='store', default=None,
+                        help='Directory where a DRAT proof of every '
+                        'unsatisfiable instance is written, named after the '
+                        'instance. Not available with --restarts or --xors')
+
+    parser.add_argument('-pb', '--binary-proofs', action='store_true',
+                        help='Write the proofs in the binary DRAT format')
+
+    parser.add_argument('-tc', '--traces', action='store', default=None,
+                        help='Directory where the search tree of every '
+                        'instance is written as a chrome trace '
+                        '(NAME.trace.json) and a per depth histogram '
+                        '(NAME.depth.tsv)')
+
+    parser.add_argument('-ts', '--trace-sample', action='store', type=int,
+                        default=1,
+                        help='Only trace one of every this number of nodes. '
+                        'DEFAULT = 1')
+
+    parser.add_argument('-tb', '--trace-buffer', action='store', type=int,
+                        default=100000,
+                        help='Maximum number of traced nodes kept, the '
+                        'oldest are dropped. DEFAULT = 100000')
+
+    options = parser.parse_args()
+
+    instances = collectInstances(options.inputs, options.manifest)
+    if not instances:
+        parser.error('no cnf files found')
+
+    for directory in (options.proofs, options.traces):
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    summary = solveAll(instances, options)
+
+    sys.stderr.write('c %s\n' % ', '.join('%s %d' % item
+                                          for item in sorted(summary.items())))
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import gc
+import os
+import re
+import sys
+import glob
+import json
+import timeit
+import argparse
+import dpll
+import datautil
+import heuristics
+
+
+__description__ = 'Microbenchmarks of the variable selection heuristics ' \
+                  'and the propagation primitives of dpll.py'
+
+# Heuristics measured at every snapshot
+HEURISTICS = [
+    ('mostOftenVariable', heuristics.mostOftenVariable),
+    ('mostEqulibratedVariable', heuristics.mostEqulibratedVariable),
+    ('mom', heuristics.mom),
+    ('jwOS', heuristics.jwOS),
+    ('jwTS', heuristics.jwTS),
+    ('dlcs', heuristics.dlcs),
+    ('dlis', heuristics.dlis),
+    ('Lookahead', heuristics.Lookahead()),
+]
+
+# Minimum measured time of every repetition, fast calls are repeated
+# until they reach it
+MIN_REPETITION_TIME = 0.002
+
+
+class Snapshot(object):
+    """
+    Search data of a formula after depth decisions, as dpll._solve sees
+    it. The decisions are taken with jwOS and followed by unit
+    propagation; a decision that reaches an empty clause is flipped, and
+    the descent stops early if both polarities fail or the formula is
+    solved, so depth is the number of decisions actually taken.
+
+    The benchmarks modify the data and must leave it as they found it
+    (see fingerprint)
+    """
+    def __init__(self, fname, depth):
+        self.instance = os.path.basename(fname)
+
+        num_vars, clauses = datautil.parseCNF(fname)
+        litclauses = datautil.classifyClausesByLiteral(clauses)
+        ctimes = dict((c, 1) for c in clauses)
+        self.cdata = dpll.ClausesData(clauses, ctimes, litclauses, None,
+                                      None, [])
+        self.variables, self.interpretation = \
+            dpll.getVarsAndFirstIntp(num_vars, self.cdata)
+
+        self.depth = 0
+        while self.depth < depth and self.cdata.clauses:
+            lit = heuristics.jwOS(self.variables, self.cdata)
+            if not (self.decide(lit) or self.decide(-lit)):
+                break
+            self.depth += 1
+
+        del self.cdata.pure_candidates[:]
+
+    def decide(self, lit):
+        """
+        Sets lit and propagates it, the changes are never undone. Returns
+        False, leaving the data untouched, if an empty clause is reached
+        """
+        cchanges = dpll.ClausesChanges(set(), [])
+        used_vars = set([abs(lit)])
+        saved = list(self.interpretation)
+
+        self.variables.discard(abs(lit))
+        self.interpretation[abs(lit)] = lit > 0
+
+        if dpll.setLiteral(lit, self.cdata, cchanges) or \
+                dpll.unitPropagation(self.variables, self.cdata,
+                                     self.interpretation, used_vars,
+                                     cchanges):
+            self.variables.update(used_vars)
+            dpll.undoClauseChanges(self.cdata, cchanges)
+            self.interpretation[:] = saved
+            return False
+
+        return True
+
+    def fingerprint(self):
+        return (len(self.cdata.clauses), sum(self.cdata.ctimes.values()),
+                sum(len(s) for s in self.cdata.litclauses.values()),
+                len(self.variables), tuple(self.interpretation))
+
+    def mostFrequentLiteral(self, allow_units=True):
+        """
+        Returns the literal with more clauses, if allow_units is False only
+        the literals without unit clauses are considered. 0 if there is
+        none
+        """
+        best = 0
+        times = 0
+        for lit, lclauses in self.cdata.litclauses.iteritems():
+            if len(lclauses) > times and \
+                    (allow_units or min(map(len, lclauses)) > 1):
+                best = lit
+                times = len(lclauses)
+        return best
+
+#
+#
+def measure(call, setup=None, teardown=None, warmup=3, repeat=15):
+    """
+    Times call(state), where state is returned by setup() and undone by
+    teardown(state) outside of the measured time. Every repetition calls it
+    enough times to last MIN_REPETITION_TIME. The garbage collector is
+    disabled while measuring, its pauses would land on random calls.
+
+    Returns the time per call of every repetition. Allocations are not
+    reported, Python 2 has no way to count them: the counter of the garbage
+    collector misses the lists, dicts, sets and tuples taken from the free
+    lists, which are most of the ones the search creates
+    """
+    setup = setup or (lambda: None)
+    teardown = teardown or (lambda state: None)
+
+    def repetition(number):
+        elapsed = 0.0
+        for _ in xrange(number):
+            state = setup()
+            start = timeit.default_timer()
+            call(state)
+            elapsed += timeit.default_timer() - start
+            teardown(state)
+        return elapsed
+
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+
+    try:
+        number = 1
+        elapsed = repetition(number)
+        while elapsed < MIN_REPETITION_TIME:
+            number *= 2 if elapsed * 10 > MIN_REPETITION_TIME else 10
+            elapsed = repetition(number)
+
+        for _ in xrange(warmup):
+            repetition(number)
+
+        times = [repetition(number) / number for _ in xrange(repeat)]
+    finally:
+        if enabled:
+            gc.enable()
+
+    return times
+
+#
+#
+def heuristicBenchmarks(snap):
+    """
+    Returns (name, call, setup, teardown) for every heuristic
+    """
+    benchmarks = []
+
+    for name, heuristic in HEURISTICS:
+        def call(state, heuristic=heuristic):
+            heuristic(snap.variables, snap.cdata)
+
+        # The probes of the lookahead are cached between decisions
+        setup = getattr(heuristic, 'reset', None)
+        benchmarks.append((name, call, setup, None))
+
+    return benchmarks
+
+#
+#
+def primitiveBenchmarks(snap):
+    """
+    Returns (name, call, setup, teardown) for every dpll primitive that
+    can be measured at the snapshot
+    """
+    benchmarks = []
+    cdata = snap.cdata
+
+    def changes():
+        return dpll.ClausesChanges(set(), [])
+
+    def undo(cchanges):
+        dpll.undoClauseChanges(cdata, cchanges)
+        del cdata.pure_candidates[:]
+
+    lit = snap.mostFrequentLiteral()
+    if lit:
+        benchmarks.append(('removeClausesWithLiteral',
+                           lambda cchanges:
+                               dpll.removeClausesWithLiteral(lit, cdata,
+                                                             cchanges),
+                           changes, undo))
+
+    # An empty clause would stop it early
+    rlit = snap.mostFrequentLiteral(allow_units=False)
+    if rlit:
+        benchmarks.append(('removeLiteralFromClauses',
+                           lambda cchanges:
+                               dpll.removeLiteralFromClauses(rlit, cdata,
+                                                             cchanges),
+                           changes, undo))
+
+    # The decision of the search at this node, propagated
+    if not cdata.clauses:
+        return benchmarks
+
+    branch = heuristics.jwOS(snap.variables, cdata)
+    probe = changes()
+    if dpll.setLiteral(branch, cdata, probe):
+        branch = -branch
+    undo(probe)
+
+    def decided():
+        cchanges = changes()
+        dpll.setLiteral(branch, cdata, cchanges)
+        return cchanges, set(), list(snap.interpretation)
+
+    def propagate(state):
+        cchanges, used_vars, _ = state
+        dpll.unitPropagation(snap.variables, cdata, snap.interpretation,
+                             used_vars, cchanges)
+
+    def restore(state):
+        cchanges, used_vars, saved = state
+        snap.variables.update(used_vars)
+        snap.interpretation[:] = saved
+        undo(cchanges)
+
+    def propagated():
+        state = decided()
+        propagate(state)
+        return state
+
+    benchmarks.append(('unitPropagation', propagate, decided, restore))
+    benchmarks.append(('undoClauseChanges',
+                       lambda state: dpll.undoClauseChanges(cdata, state[0]),
+                       propagated,
+                       lambda state: restore((dpll.ClausesChanges(set(), []),
+                                              state[1], state[2]))))
+
+    return benchmarks
+
+#
+#
+def runBenchmarks(files, depths, pattern=None, warmup=3, repeat=15,
+                  out=sys.stdout):
+    """
+    Runs every benchmark whose name matches pattern at every snapshot and
+    returns {key: result}, with key "instance:depth:name"
+    """
+    results = {}
+
+    # Allocations per call can not be counted on Python 2 (see measure),
+    # the column says so instead of showing a made up number
+    out.write('%-22s %5s %7s %-26s %12s %12s %7s\n' %
+              ('instance', 'depth', 'clauses', 'benchmark', 'median us',
+               'ops/sec', 'allocs'))
+
+    for fname in files:
+        reached = set()
+        for depth in depths:
+            snap = Snapshot(fname, depth)
+
+            # A shallower descent already measured
+            if snap.depth in reached:
+                continue
+            reached.add(snap.depth)
+
+            nclauses = len(snap.cdata.clauses)
+            before = snap.fingerprint()
+
+            for name, call, setup, teardown in heuristicBenchmarks(snap) + \
+                    primitiveBenchmarks(snap):
+                if pattern is not None and not re.search(pattern, name):
+                    continue
+
+                times = measure(call, setup, teardown, warmup, repeat)
+                if snap.fingerprint() != before:
+                    raise RuntimeError('%s modified the snapshot' % name)
+
+                times.sort()
+                median = times[len(times) // 2]
+                key = '%s:%d:%s' % (snap.instance, snap.depth, name)
+                results[key] = {'median': median, 'best': times[0],
+                                'clauses': nclauses}
+
+                out.write('%-22s %5d %7d %-26s %12.2f %12.1f %7s\n' %
+                          (snap.instance, snap.depth, nclauses, name,
+                           median * 1e6, 1.0 / median, 'n/a'))
+                out.flush()
+
+    return results
+
+#
+#
+def compareBaseline(results, baseline, tolerance, out=sys.stdout):
+    """
+    Reports the benchmarks whose best time grew more than tolerance (a
+    fraction) over the baseline. The best time is the least affected by
+    the load of the machine.
+
+    Returns the number of regressions
+    """
+    regressions = 0
+
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+
+        ratio = results[key]['best'] / baseline[key]['best']
+
+        if ratio > 1 + tolerance:
+            regressions += 1
+            out.write('REGRESSION %s: %.2fx time\n' % (key, ratio))
+
+    missing = len(set(baseline) - set(results))
+    out.write('%d regressions, %d benchmarks compared, %d not run\n' %
+              (regressions, len(set(results) & set(baseline)), missing))
+    return regressions
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('files', nargs='*',
+                        help='cnf files. DEFAULT = the instances of cnf/')
+
+    parser.add_argument('-d', '--depths', action='store', default='0,4,8',
+                        help='Comma separated numbers of decisions of the '
+                        'snapshots. DEFAULT = 0,4,8')
+
+    parser.add_argument('-b', '--benchmarks', action='store', default=None,
+                        help='Only run the benchmarks whose name matches '
+                        'this regular expression')
+
+    parser.add_argument('-w', '--warmup', action='store', type=int,
+                        default=3,
+                        help='Repetitions run before measuring. DEFAULT = 3')
+
+    parser.add_argument('-r', '--repeat', action='store', type=int,
+                        default=15,
+                        help='Measured repetitions, the median is '
+                        'reported. DEFAULT = 15')
+
+    parser.add_argument('-sb', '--save-baseline', action='store',
+                        default=None,
+                        help='json file where the results are saved as a '
+                        'baseline')
+
+    parser.add_argument('-bl', '--baseline', action='store', default=None,
+                        help='json file with a baseline to compare with. '
+                        'Exits with status 1 if there are regressions')
+
+    parser.add_argument('-tol', '--tolerance', action='store', type=float,
+                        default=0.25,
+                        help='Fraction the best time can grow over the '
+                        'baseline before it is a regression. DEFAULT = 0.25')
+
+    options = parser.parse_args()
+
+    files = options.files
+    if not files:
+        base = os.path.dirname(os.path.abspath(__file__))
+        files = sorted(glob.glob(os.path.join(base, 'cnf', '*')))
+
+    depths = [int(d) for d in options.depths.split(',')]
+
+    results = runBenchmarks(files, depths, options.benchmarks,
+                            options.warmup, options.repeat)
+
+    if options.save_baseline is not None:
+        with open(options.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+        if compareBaseline(results, baseline, options.tolerance):
+            sys.exit(1)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import heuristics
+
+# Formulas with more variables are solved with the clause sets of dpll.py
+# when the backend is chosen automatically. Every operation on a clause
+# works with integers of num_vars bits, so they stop paying off once the
+# masks are much longer than a few machine words
+MAX_AUTO_VARIABLES = 2048
+
+#
+#
+def toBitClauses(clauses):
+    """
+    Converts the clauses to tuples (pos, neg, size): the bit v of pos (neg)
+    is set if the literal v (-v) is in the clause and size is the number of
+    literals. Tautologies are dropped
+    """
+    bclauses = []
+
+    for clause in clauses:
+        pos = neg = 0
+        for lit in clause:
+            if lit > 0:
+                pos |= 1 << lit
+            else:
+                neg |= 1 << -lit
+
+        if not pos & neg:
+            bclauses.append((pos, neg, len(clause)))
+
+    return bclauses
+
+#
+#
+def propagate(clauses, tmask, fmask):
+    """
+    propagate(clauses, tmask, fmask) -> (clauses, tmask, fmask) | None
+
+    Assigns True to the variables of tmask and False to the ones of fmask
+    and propagates the unit clauses. Satisfied clauses are dropped and the
+    assigned variables are removed from the rest.
+
+    Units are assigned as soon as they are found, so the clauses after them
+    in the same pass already see the assignment. Passes are repeated until
+    one finds no units. Returns the remaining clauses and the extended
+    masks, or None if a clause becomes empty
+
+    Shortened clauses equal to another one are dropped, like the clause
+    sets of dpll.py keep them once, so the heuristics count the same
+    clauses with both backends
+    """
+    shortened = False
+
+    while True:
+        assigned = tmask | fmask
+        keep = ~assigned
+        found = False
+        residual = []
+        append = residual.append
+
+        for pos, neg, size in clauses:
+            if pos & tmask or neg & fmask:
+                continue
+
+            # Only the shortened clauses need their size counted again
+            if (pos | neg) & assigned:
+                pos &= keep
+                neg &= keep
+                if not (pos or neg):
+                    return None
+                size = bin(pos | neg).count('1')
+                shortened = True
+
+            if size == 1:
+                tmask |= pos
+                fmask |= neg
+                assigned |= pos | neg
+                keep = ~assigned
+                found = True
+                continue
+
+            append((pos, neg, size))
+
+        if not found:
+            if shortened:
+                seen = set()
+                residual = [c for c in residual
+                            if c not in seen and not seen.add(c)]
+            return residual, tmask, fmask
+
+        clauses = residual
+
+#
+#
+def pureLiterals(clauses):
+    """
+    Returns the masks of the variables that only appear positive and only
+    appear negative
+    """
+    allpos = allneg = 0
+    for pos, neg, _ in clauses:
+        allpos |= pos
+        allneg |= neg
+
+    return allpos & ~allneg, allneg & ~allpos
+
+#
+#
+def literalCounts(clauses, num_vars, weighted):
+    """
+    Returns two lists with the number of clauses where every variable
+    appears positive and negative. If weighted every clause counts
+    2^-length, as in the Jeroslow-Wang heuristics
+    """
+    pcount = [0] * (num_vars + 1)
+    ncount = [0] * (num_vars + 1)
+
+    for pos, neg, size in clauses:
+        w = 2.0 ** -size if weighted else 1
+
+        while pos:
+            low = pos & -pos
+            pcount[low.bit_length() - 1] += w
+            pos ^= low
+
+        while neg:
+            low = neg & -neg
+            ncount[low.bit_length() - 1] += w
+            neg ^= low
+
+    return pcount, ncount
+
+#
+#
+def bitHeuristic(heuristic):
+    """
+    bitHeuristic(heuristic) -> (weighted, score) | None
+
+    Version for this backend of the heuristics of heuristics.py. score(p, n)
+    returns the value of a variable that appears p times positive and n
+    times negative (see literalCounts) and the sign of the literal to try
+    first. Returns None for the other heuristics
+    """
+    return {
+        heuristics.mostOftenVariable:
+            (False, lambda p, n: (p + n, 1)),
+        heuristics.mostEqulibratedVariable:
+            (False, lambda p, n: (p * n * 1024 + p + n, 1)),
+        heuristics.mom:
+            (False, lambda p, n: (p * n + 2**10 * (p + n), 1)),
+        heuristics.jwOS:
+            (True, lambda p, n: (p + n, 1)),
+        heuristics.jwTS:
+            (True, lambda p, n: (p + n, -1 if n > p else 1)),
+        heuristics.dlcs:
+            (False, lambda p, n: (p + n, 1 if p >= n else -1)),
+        heuristics.dlis:
+            (False, lambda p, n: (max(p, n), -1 if n > p else 1)),
+    }.get(heuristic)
+
+#
+#
+def selectLiteral(clauses, num_vars, weighted, score):
+    """
+    Returns the literal of the variable with the highest score, the first
+    one on ties
+    """
+    pcount, ncount = literalCounts(clauses, num_vars, weighted)
+
+    best = -1
+    lit = 0
+
+    for v in xrange(1, num_vars + 1):
+        p = pcount[v]
+        n = ncount[v]
+        if not (p or n):
+            continue
+
+        value, sign = score(p, n)
+        if value > best:
+            best = value
+            lit = sign * v
+
+    return lit
+
+#
+#
+def solve(num_variables, clauses, selection_heuristic, run_stats,
+          pure_literal_depth=None):
+    """
+    DPLL over clauses stored as bitmasks (see toBitClauses). Unit
+    detection, satisfaction and literal removal are bit operations over all
+    the variables of a clause at once, and every node works on its own
+    filtered list of clauses, so nothing has to be undone.
+
+    Only the heuristics of heuristics.py supported by bitHeuristic can be
+    used. Returns the same as dpll.solve
+    """
+    weighted, score = bitHeuristic(selection_heuristic)
+
+    def select(bclauses):
+        return selectLiteral(bclauses, num_variables, weighted, score)
+
+    res = propagate(toBitClauses(clauses), 0, 0)
+    if res is not None:
+        res = _solve(res[0], res[1], res[2], 0, select, run_stats,
+                     pure_literal_depth)
+
+    if res is None:
+        return (False, frozenset())
+
+    # The variables left unassigned do not appear in any clause
+    tmask = res[0]
+    interpretation = [None] + [bool(tmask >> v & 1)
+                               for v in xrange(1, num_variables + 1)]
+    return (True, interpretation)
+
+
+def _solve(clauses, tmask, fmask, depth, select, run_stats,
+           pure_literal_depth):
+    """
+    Eliminates the pure literals of the propagated clauses and branches.
+    Returns the masks (tmask, fmask) of a model or None
+    """
+    if pure_literal_depth is None or depth <= pure_literal_depth:
+        # Pure literals only satisfy clauses, no unit can appear. Removing
+        # their clauses can make other literals pure, like in
+        # dpll.pureLiteral they are eliminated until there are none
+        while clauses:
+            pure_t, pure_f = pureLiterals(clauses)
+            if not (pure_t or pure_f):
+                break
+
+            clauses, tmask, fmask = propagate(clauses, tmask | pure_t,
+                                              fmask | pure_f)
+
+    if not clauses:
+        return (tmask, fmask)
+
+    lit = select(clauses)
+    run_stats.add_split()
+
+    bit = 1 << abs(lit)
+    for branch in (lit, -lit):
+        if branch > 0:
+            res = propagate(clauses, tmask | bit, fmask)
+        else:
+            res = propagate(clauses, tmask, fmask | bit)
+
+        if res is not None:
+            res = _solve(res[0], res[1], res[2], depth + 1, select,
+                         run_stats, pure_literal_depth)
+            if res is not None:
+                return res
+
+    return None
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+#
+#
+def conflictGraph(clauses):
+    """
+    Returns a dictionary that for every variable contains the set of
+    variables that can not be True at the same time, one per binary clause
+    with two negative literals: the clause (-a, -b) forbids a and b together
+    """
+    neighbours = {}
+
+    for clause in clauses:
+        if len(clause) == 2:
+            a, b = clause
+            if a > 0 or b > 0:
+                continue
+            neighbours.setdefault(-a, set()).add(-b)
+            neighbours.setdefault(-b, set()).add(-a)
+
+    return neighbours
+
+#
+#
+def pairClause(a, b):
+    """
+    Returns the binary clause that forbids a and b to be True together
+    """
+    return frozenset([-a, -b])
+
+#
+#
+def detectAtMostOne(clauses, min_size=3):
+    """
+    detectAtMostOne(clauses, min_size) -> (groups, covered)
+
+    Finds groups of variables where at most one of them can be True because
+    the formula has the binary clause (-a, -b) for every pair of them.
+
+    Only groups of positive literals are detected. The search leaves
+    unassigned the variables that do not appear in the remaining clauses,
+    and they are read as False, which never breaks one of these groups
+
+        - groups: list of tuples of variables, with at least min_size
+                  variables each
+
+        - covered: set with the binary clauses implied by the groups. They
+                   can be removed from the formula when the groups are
+                   propagated natively
+
+    First every clause whose literals are pairwise exclusive is taken as a
+    group. The clause itself stays in the formula, so together they are an
+    exactly-one constraint. Then the remaining binary clauses are covered
+    greedily with cliques of the conflict graph, starting from the
+    variables with more conflicts
+    """
+    neighbours = conflictGraph(clauses)
+
+    groups = []
+    covered = set()
+
+    def addGroup(lits):
+        groups.append(tuple(lits))
+        for i, a in enumerate(lits):
+            for b in lits[i+1:]:
+                covered.add(pairClause(a, b))
+
+    # Exactly one groups
+    for clause in clauses:
+        if len(clause) < min_size:
+            continue
+
+        lits = list(clause)
+        if all(b in neighbours.get(a, ()) for i, a in enumerate(lits)
+                                          for b in lits[i+1:]):
+            addGroup(lits)
+
+    # At most one groups with the binary clauses not covered yet
+    for lit in sorted(neighbours, key=lambda l: -len(neighbours[l])):
+        while True:
+            candidates = [x for x in neighbours[lit]
+                          if pairClause(lit, x) not in covered]
+            if len(candidates) < min_size - 1:
+                break
+
+            candidates.sort(key=lambda l: -len(neighbours[l]))
+
+            clique = [lit]
+            for x in candidates:
+                if all(x in neighbours[y] for y in clique[1:]):
+                    clique.append(x)
+
+            if len(clique) < min_size:
+                break
+
+            addGroup(clique)
+
+    return groups, covered
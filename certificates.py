@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+# Result lines of the competition format
+SATISFIABLE_LINE = 's SATISFIABLE\n'
+UNSATISFIABLE_LINE = 's UNSATISFIABLE\n'
+
+# Maximum length of a "v" line
+MAX_LINE_LENGTH = 78
+
+# Bytes kept in memory before writing to the file
+BUFFER_SIZE = 1 << 16
+
+#
+#
+def writeModel(out, bool_result, buffer_size=BUFFER_SIZE):
+    """
+    writeModel(out, bool_result)
+
+        - out: File where the model is written
+        - bool_result: iterable with the truth value assignation in order
+
+    Writes the model in the competition format: the "s SATISFIABLE" line
+    and "v" lines of at most MAX_LINE_LENGTH characters ending with a 0.
+    The lines are written every buffer_size bytes, the model is never held
+    in memory as a single string
+
+    f.e [True, False, False] is written as:
+
+    s SATISFIABLE
+    v 1 -2 -3 0
+    """
+    out.write(SATISFIABLE_LINE)
+
+    buffered = []
+    size = 0
+
+    line = ['v']
+    length = 1
+
+    def literals():
+        for ind, b in enumerate(bool_result):
+            yield str(ind + 1) if b else str(-(ind + 1))
+        yield '0'
+
+    for lit in literals():
+        if length + 1 + len(lit) > MAX_LINE_LENGTH:
+            text = ' '.join(line) + '\n'
+            buffered.append(text)
+            size += len(text)
+
+            if size >= buffer_size:
+                out.write(''.join(buffered))
+                buffered = []
+                size = 0
+
+            line = ['v']
+            length = 1
+
+        line.append(lit)
+        length += 1 + len(lit)
+
+    buffered.append(' '.join(line) + '\n')
+    out.write(''.join(buffered))
+
+
+class DratWriter(object):
+    """
+    Writes a DRAT proof of unsatisfiability to a file while the search
+    runs. Lemmas and deletions are buffered and written every buffer_size
+    bytes, so logging does not wait for the disk at every clause.
+
+    In text mode every line is a clause ended by 0, deletions start with
+    "d". The binary mode writes "a" or "d" followed by the literals as
+    variable length integers of 2*var + sign, ended by a 0 byte, as read
+    by drat-trim
+    """
+    def __init__(self, path, binary=False, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self.file = open(path, 'wb')
+        self.buffered = []
+        self.size = 0
+        self.n_lemmas = 0
+        self.n_deletions = 0
+
+    def add(self, clause):
+        """
+        Adds a lemma. If it is a RAT clause, its first literal must be the
+        pivot
+        """
+        self.n_lemmas += 1
+        self._write(self._encode('a', '', clause))
+
+    def delete(self, clause):
+        self.n_deletions += 1
+        self._write(self._encode('d', 'd ', clause))
+
+    def _encode(self, binary_tag, text_tag, clause):
+        if not self.binary:
+            return '%s%s\n' % (text_tag, ' '.join(map(str, list(clause) +
+                                                       [0])))
+
+        data = bytearray(binary_tag)
+        for lit in clause:
+            value = 2 * lit if lit > 0 else -2 * lit + 1
+            while value > 0x7f:
+                data.append(value & 0x7f | 0x80)
+                value >>= 7
+            data.append(value)
+        data.append(0)
+        return str(data)
+
+    def _write(self, data):
+        self.buffered.append(data)
+        self.size += len(data)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffered:
+            self.file.write(''.join(self.buffered))
+            self.buffered = []
+            self.size = 0
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*
 
 import sys
+import collections
 
 #
 #
@@ -13,14 +14,26 @@ def parseCNF(fname):
         
         - clauses: All the clauses into a set of frozensets
                     
+    """
+    with open(fname, 'r') as cnf_file:
+        return parseCNFLines(cnf_file, fname)
+
+#
+#
+def parseCNFLines(lines, name='<input>'):
+    """
+    Parses dimacs cnf lines from any iterable, see parseCNF. name is only
+    used in the error messages
     """
     num_vars = 0
     clauses = set()
 
-    cnf_file = open(fname, 'r')    
-    
+    # Clauses can span several lines, they end with a 0
+    clause = set()
+    nline = 0
+
     try:
-        for nline, line in enumerate(cnf_file):
+        for nline, line in enumerate(lines):
             lvalues = line.strip().split()
             
             if not lvalues or lvalues[0] == 'c':
@@ -36,16 +49,11 @@ def parseCNF(fname):
                 
             else:
                 values = map(int, lvalues)                    
-                clause = set()
                 
                 for lit in values:
                     if lit == 0:
-                        if clause not in clauses:                        
-                        
-                            clause = frozenset(clause)
-                            clauses.add( clause )
-
-                        clause = None # Check line ends with 0
+                        clauses.add( frozenset(clause) )
+                        clause = set()
                         
                     else:
                         clause.add(lit)
@@ -55,12 +63,12 @@ def parseCNF(fname):
                                 ', it must be in range [1, %d].'
                                 % (lit, num_vars) )
 
-                if clause:
-                    raise SyntaxError('Not found the trailing 0')
+        if clause:
+            raise SyntaxError('Not found the trailing 0')
                 
     except SyntaxError, e:
         sys.stderr.write('Error parsing file "%s" (%d): %s\n' % 
-                                    (fname, nline, str(e)) )
+                                    (name, nline, str(e)) )
         raise e
             
     return num_vars, clauses
@@ -129,4 +137,200 @@ def isPureLiteral(lit, litclauses):
     
     Returns true if the specified lit is a pure literal
     """
-    return litclauses.has_key(lit) and not litclauses.has_key(-lit)
\ No newline at end of file
+    return litclauses.has_key(lit) and not litclauses.has_key(-lit)
+
+
+class LRUCache(object):
+    """
+    Dictionary with a maximum number of entries. When it is full, the
+    least recently used entry is evicted
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """
+        Returns the value of key and marks it as the most recently used
+        """
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+MASK64 = (1 << 64) - 1
+
+#
+#
+def clauseKey(clause):
+    """
+    64 bit random looking key of a clause. The hash of a frozenset does not
+    depend on the order of its literals and it is cached by the frozenset,
+    it is scrambled with the splitmix64 finalizer so the xor of several keys
+    does not cancel out
+    """
+    z = hash(clause) & MASK64
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & MASK64
+    return z ^ (z >> 31)
+
+
+class FormulaHash(object):
+    """
+    Zobrist style hash of a set of clauses: the xor of the keys of its
+    clauses. Adding or removing a clause is a single xor with its key, so
+    the hash of the residual formula is updated while the search removes
+    and restores clauses
+
+    Keys only depend on the literals of the clause, so the same residual
+    formula has the same hash in different searches over the same CNF
+    """
+    def __init__(self, clauses=()):
+        self.value = 0
+        for clause in clauses:
+            self.toggle(clause)
+
+    def toggle(self, clause):
+        """
+        Adds the clause to the hash, or removes it if it was already there
+        """
+        self.value ^= clauseKey(clause)
+
+
+class BinaryImplications(object):
+    """
+    Implication lists of the binary clauses. For every clause (a, b) the
+    literal -a implies b and -b implies a:
+
+        for b in implications.implied(-a, ctimes):
+            ... b must be True ...
+
+    Clauses are never removed from the lists. An entry is only used while
+    its clause is in the formula (ctimes[clause] > 0), so the lists stay
+    valid when the search removes and restores clauses
+
+    At-most-one groups of literals can be added too (see cardinality.py).
+    When a literal of a group becomes True, the negation of every other
+    literal of the group is implied. Groups are not part of the clauses
+    so they are always active
+
+    The search reports the variables it assigns and unassigns (see assign
+    and unassign), so the number of unassigned members of every group is
+    kept up to date, the same way the clause sets of litclauses follow the
+    residual formula
+    """
+    def __init__(self, clauses=(), groups=()):
+        self.implications = {}
+        self.registered = set()
+
+        self.groups = []
+        self.lit_groups = {}
+        # Unassigned members of every group
+        self.free = []
+        # Groups of every variable, in any polarity
+        self.var_groups = {}
+
+        for clause in clauses:
+            if len(clause) == 2:
+                self.add(clause)
+
+        for group in groups:
+            self.addGroup(group)
+
+    def add(self, clause):
+        """
+        Registers a binary clause
+        """
+        if clause in self.registered:
+            return
+        self.registered.add(clause)
+
+        a, b = clause
+        self.implications.setdefault(-a, []).append((b, clause))
+        self.implications.setdefault(-b, []).append((a, clause))
+
+    def addGroup(self, group):
+        """
+        Registers an at-most-one group of literals
+        """
+        gid = len(self.groups)
+        self.groups.append(tuple(group))
+        self.free.append(len(group))
+
+        for lit in group:
+            self.lit_groups.setdefault(lit, []).append(gid)
+            self.var_groups.setdefault(abs(lit), []).append(gid)
+
+    def assign(self, var):
+        """
+        Records that var has been assigned, its groups have one unassigned
+        member less
+        """
+        for gid in self.var_groups.get(var, ()):
+            self.free[gid] -= 1
+
+    def unassign(self, var):
+        """
+        Undoes assign(var)
+        """
+        for gid in self.var_groups.get(var, ()):
+            self.free[gid] += 1
+
+    def groupOccurrences(self, lit):
+        """
+        Returns the number of binary clauses with lit that the groups
+        represent in the residual formula. lit must be unassigned: the
+        clause (-a, -b) of a group is satisfied as soon as a or b is
+        assigned, so only the other unassigned members count
+        """
+        return sum(self.free[gid] - 1 for gid in self.lit_groups.get(-lit, ()))
+
+    def inGroup(self, lit):
+        """
+        Returns True if lit belongs to an at-most-one group
+        """
+        return lit in self.lit_groups
+
+    def groupNeighbours(self, lit):
+        """
+        Returns the other literals of the groups of lit
+        """
+        return [m for gid in self.lit_groups.get(lit, ())
+                  for m in self.groups[gid] if m != lit]
+
+    def implied(self, lit, ctimes):
+        """
+        Returns the literals implied by lit through the binary clauses that
+        are still in the formula and the at-most-one groups
+        """
+        implied = [b for b, clause in self.implications.get(lit, ())
+                   if ctimes.get(clause, 0) > 0]
+
+        if lit in self.lit_groups:
+            implied.extend(-m for m in self.groupNeighbours(lit))
+
+        return implied
@@ -2,28 +2,272 @@
 import numpy as np
 import satutil
 import datautil
+import cardinality
+import xors
+import bitset
 import collections
 
 # Contains clause information
+#   - implications: datautil.BinaryImplications or None
+#   - fhash: datautil.FormulaHash of the clauses or None
+#   - pure_candidates: List of literals that may have become pure, or None
+#                      to not track them (see pureLiteral)
 ClausesData = collections.namedtuple('ClausesData',
-                                     'clauses ctimes litclauses')
+                                     'clauses ctimes litclauses implications '
+                                     'fhash pure_candidates')
 
 # Contains clause changes (removed and modified)
 ClausesChanges = collections.namedtuple('ClausesChanges',
                                         'rclauses mclauses')
 
+# Formula representations (see solve)
+SETS = 'sets'
+BITSET = 'bitset'
+AUTO = 'auto'
+BACKENDS = (SETS, BITSET, AUTO)
 
-def solve(num_variables, clauses, selection_heuristic, run_stats):
+
+class RestartSearch(Exception):
+    """
+    Raised inside the search when the restart policy asks for a restart
+    """
+    pass
+
+
+class SearchState(object):
+    """
+    Search information that survives restarts
+
+        - restart_policy: Object with an on_conflict() method (see restarts.py)
+                          or None to never restart
+        - phases: Interpretation of the previous run. Once the search has
+                  been restarted, the branching literal takes the last
+                  polarity assigned to its variable (phase saving)
+        - components: If True the residual formula is split into variable
+                      disjoint components that are solved independently
+        - binary_implications: If True the binary clauses are propagated
+                               through implication lists
+        - at_most_one: If True the pairwise at-most-one encodings are
+                       replaced by native groups (needs binary_implications)
+        - xors: List of xor constraints (see xors.py) propagated with
+                gaussian elimination, or None
+        - unsat_cache: datautil.LRUCache with the hashes of the residual
+                       formulas proven unsatisfiable, or None. It can be
+                       shared by several searches over the same formula
+        - pure_literal_depth: Pure literals are only eliminated up to this
+                              number of decisions (0 only at the root), or
+                              at every node if None
+        - depth: Number of decisions of the current node
+        - proof: certificates.DratWriter where the lemmas that refute the
+                 formula are written, or None
+        - path: Decision literals of the current node
+        - tracer: tracer.SearchTracer that records the nodes, or None
+    """
+    def __init__(self, restart_policy=None, components=False,
+                 binary_implications=False, at_most_one=False,
+                 unsat_cache=None, pure_literal_depth=None, proof=None,
+                 tracer=None):
+        self.restart_policy = restart_policy
+        self.components = components
+        self.binary_implications = binary_implications or at_most_one
+        self.at_most_one = at_most_one
+        self.xors = None
+        self.unsat_cache = unsat_cache
+        self.pure_literal_depth = pure_literal_depth
+        self.depth = 0
+        self.phases = None
+        self.interpretation = None
+        self.proof = proof
+        self.path = []
+        self.tracer = tracer
+
+    def isKnownUnsat(self, cdata):
+        """
+        Returns True if the residual formula is in the unsat cache. The
+        number of clauses is stored with the hash to make collisions less
+        likely
+        """
+        return self.unsat_cache is not None and cdata.fhash is not None and \
+            self.unsat_cache.get(cdata.fhash.value) == len(cdata.clauses)
+
+    def addUnsat(self, key, nclauses):
+        """
+        Records that the residual formula with hash key is unsatisfiable
+        """
+        if key is not None:
+            self.unsat_cache.put(key, nclauses)
+
+    def learn(self, lits=()):
+        """
+        Adds to the proof the clause made of lits and the negation of every
+        decision of the current node: lits follow from the decisions
+        """
+        if self.proof is not None:
+            self.proof.add(list(lits) + [-l for l in self.path])
+
+    def learnPure(self, pure_lits):
+        """
+        Adds to the proof the pure literals of the current node, each one
+        implied by the decisions. The clauses are RAT on the pure literal,
+        every clause with its negation is already satisfied. Returns the
+        clauses, they must be deleted with forget() when the node fails
+        """
+        clauses = [[pl] + [-l for l in self.path] for pl in pure_lits]
+        for clause in clauses:
+            self.proof.add(clause)
+        return clauses
+
+    def forget(self, clauses):
+        """
+        Deletes clauses from the proof
+        """
+        for clause in clauses:
+            self.proof.delete(clause)
+
+    def conflict(self):
+        """
+        Notifies a conflict to the restart policy and unwinds the search
+        if it is time to restart
+        """
+        if self.tracer is not None:
+            self.tracer.conflict()
+
+        if self.restart_policy is not None and \
+                self.restart_policy.on_conflict():
+            raise RestartSearch()
+
+
+def resetHeuristic(heuristic):
+    """
+    Forgets what heuristic kept from previous searches, f.e the probe cache
+    of heuristics.Lookahead. It is keyed by literal, so it would be reused
+    on another formula or episode
+    """
+    reset = getattr(heuristic, 'reset', None)
+    if reset is not None:
+        reset()
+
+
+def solve(num_variables, clauses, selection_heuristic, run_stats,
+          restart_policy=None, components=False, binary_implications=False,
+          at_most_one=False, xor_reasoning=False, unsat_cache=None,
+          pure_literal_depth=None, backend=SETS, proof=None, tracer=None):
     """
     Uses the dpll algorithm to determine if the formula is satisfiable or
     unsatisfiable
 
+        - restart_policy: Optional restart schedule (see restarts.py). Every
+                          restart is recorded in run_stats
+        - components: Solve the independent components of the residual
+                      formula separately
+        - binary_implications: Find the unit clauses produced by binary
+                               clauses through implication lists
+        - at_most_one: Replace the binary clauses of pairwise at-most-one
+                       and exactly-one encodings by native groups that are
+                       propagated through the implication lists
+        - xor_reasoning: Detect the xor constraints encoded in the clauses
+                         and propagate them with gaussian elimination after
+                         every unit propagation
+        - unsat_cache: datautil.LRUCache shared between calls with the same
+                       formula. The residual formulas proven unsatisfiable
+                       are stored there and pruned when they appear again.
+                       Can not be used with at_most_one or xor_reasoning,
+                       the groups and xors are not part of the hash
+        - pure_literal_depth: Only eliminate pure literals at nodes with at
+                              most this number of decisions, 0 restricts it
+                              to the root. None eliminates them everywhere
+        - backend: SETS searches over the clause sets of this module. BITSET
+                   uses bitset.py, that only supports the heuristics of
+                   bitHeuristic and none of the options above except
+                   pure_literal_depth. The heuristics see the same clauses,
+                   but ties between variables may be broken differently.
+                   AUTO uses BITSET when it can and the formula has at
+                   most bitset.MAX_AUTO_VARIABLES variables
+        - proof: certificates.DratWriter. If the formula is unsatisfiable a
+                 DRAT proof is written to it: the negation of the decisions
+                 of every failed branch, the pure literals as RAT clauses
+                 and finally the empty clause. Can not be used with
+                 restart_policy, unsat_cache or xor_reasoning, their
+                 deductions are not checkable with unit propagation
+        - tracer: tracer.SearchTracer that records every node of the
+                  search. Not available with the bitset backend
+
     Returns a tuple with the following formats:
         - If the formula is satisfiable
             (True, [None, truth_value1, truth_vaue2, ...] )
         - If the formula is unsatisfiable
             (False, frozenset() )
     """
+    if unsat_cache is not None and (at_most_one or xor_reasoning):
+        raise ValueError("The unsat cache can not be used with at-most-one "
+                         "groups or xor reasoning")
+
+    if proof is not None and (restart_policy is not None or
+                              unsat_cache is not None or xor_reasoning):
+        raise ValueError("Proofs can not be written with restarts, the "
+                         "unsat cache or xor reasoning")
+
+    resetHeuristic(selection_heuristic)
+
+    if backend != SETS:
+        plain = restart_policy is None and proof is None and \
+            tracer is None and \
+            not (components or binary_implications or at_most_one or
+                 xor_reasoning or unsat_cache is not None)
+        supported = plain and \
+            bitset.bitHeuristic(selection_heuristic) is not None
+
+        if backend == BITSET and not supported:
+            raise ValueError("The bitset backend only supports plain "
+                             "searches with the heuristics of heuristics.py")
+
+        if supported and (backend == BITSET or
+                          num_variables <= bitset.MAX_AUTO_VARIABLES):
+            return bitset.solve(num_variables, clauses, selection_heuristic,
+                                run_stats, pure_literal_depth)
+
+    sstate = SearchState(restart_policy, components, binary_implications,
+                         at_most_one, unsat_cache, pure_literal_depth, proof,
+                         tracer)
+
+    if xor_reasoning:
+        sstate.xors = xors.detectXors(clauses)
+
+    if restart_policy is None:
+        res = _solveFromScratch(num_variables, clauses, selection_heuristic,
+                                run_stats, sstate)
+
+        # Every branch has been refuted
+        if not res[0] and proof is not None:
+            proof.add([])
+
+        return res
+
+    # The search modifies the clauses in place, keep the original ones to
+    # start again after a restart
+    original = list(clauses)
+
+    while True:
+        try:
+            return _solveFromScratch(num_variables, clauses,
+                                     selection_heuristic, run_stats, sstate)
+        except RestartSearch:
+            run_stats.add_restart()
+            sstate.phases = sstate.interpretation
+            clauses = set(original)
+
+
+def _solveFromScratch(num_variables, clauses, selection_heuristic, run_stats,
+                      sstate):
+    """
+    Builds the search data structures and runs dpll over them
+    """
+
+    # Replace the pairwise at-most-one clauses by native groups
+    groups = ()
+    if sstate.at_most_one:
+        groups, covered = cardinality.detectAtMostOne(clauses)
+        clauses.difference_update(covered)
 
     # Dictionary with clauses classified by literals
     litclauses = datautil.classifyClausesByLiteral(clauses)
@@ -33,17 +277,60 @@ def solve(num_variables, clauses, selection_heuristic, run_stats):
     # branching some clauses can appear more than once
     ctimes = { c : 1 for c in clauses }
 
+    # Implication lists of the binary clauses
+    implications = None
+    if sstate.binary_implications:
+        implications = datautil.BinaryImplications(clauses, groups)
+
+    # Hash of the residual formula to look it up in the unsat cache
+    fhash = None
+    if sstate.unsat_cache is not None:
+        fhash = datautil.FormulaHash(clauses)
+
+    # Every literal is checked at the root, then only the ones whose
+    # negation disappears
+    pure_candidates = litclauses.keys()
+
     # We use an struct to have less parameters
-    cdata = ClausesData(clauses, ctimes, litclauses)
+    cdata = ClausesData(clauses, ctimes, litclauses, implications, fhash,
+                        pure_candidates)
 
     variables, interpretation = getVarsAndFirstIntp(num_variables, cdata)
+    sstate.interpretation = interpretation
+    sstate.depth = 0
 
-    return _solve(variables, cdata, interpretation, selection_heuristic, run_stats)
+    return _solve(variables, cdata, interpretation, selection_heuristic,
+                  run_stats, sstate)
 
 
-def _solve(variables, cdata, interpretation, heuristic, run_stats):
+def _solve(variables, cdata, interpretation, heuristic, run_stats, sstate,
+           pending=()):
+    """
+    DPLL recursive implementation, see _solveNode. Only adds the calls to
+    the tracer, if there is one
     """
-    DPLL recursive implementation
+    if sstate.tracer is None:
+        return _solveNode(variables, cdata, interpretation, heuristic,
+                          run_stats, sstate, pending)
+
+    sstate.tracer.enter(sstate.depth)
+    res = None
+    try:
+        res = _solveNode(variables, cdata, interpretation, heuristic,
+                         run_stats, sstate, pending)
+    finally:
+        sstate.tracer.exit(res is not None and res[0])
+
+    return res
+
+
+def _solveNode(variables, cdata, interpretation, heuristic, run_stats,
+               sstate, pending=()):
+    """
+    Solves a node of the search
+
+    pending are literals assigned by the caller whose implications (see
+    unitPropagation) have not been propagated yet
 
     Performs the following steps:
         - Checks if a valid interpretation has been found
@@ -56,84 +343,206 @@ def _solve(variables, cdata, interpretation, heuristic, run_stats):
     """
     # Solved by previous assignation
     if not cdata.clauses:
-        return (True, interpretation)
+        return satisfied(variables, cdata, interpretation)
+
+    # Residual formula already proven unsatisfiable, maybe by a previous
+    # search over the same formula
+    if sstate.isKnownUnsat(cdata):
+        sstate.conflict()
+        return (False, frozenset())
+
+    key = None
+    if sstate.unsat_cache is not None and cdata.fhash is not None:
+        key = cdata.fhash.value
+    nclauses = len(cdata.clauses)
 
     # D.structures used to store unit propagation and pure literal changes
     used_vars = set()
     cchanges = ClausesChanges(set(), [])
 
-    # Performs unit propagation
-    if unitPropagation(variables, cdata, interpretation, used_vars, cchanges):
+    # Performs unit propagation, and gaussian elimination if there are xors
+    conflict = unitPropagation(variables, cdata, interpretation, used_vars,
+                               cchanges, pending) or \
+        (sstate.xors and xorPropagation(variables, cdata, interpretation,
+                                        used_vars, cchanges, sstate.xors))
+
+    if sstate.tracer is not None:
+        sstate.tracer.propagated(len(used_vars))
+
+    if conflict:
 
         # Recover state of unitPropagation
-        variables.update(used_vars)
+        unassignVariables(variables, used_vars, cdata)
         undoClauseChanges(cdata, cchanges)
 
+        sstate.addUnsat(key, nclauses)
+        sstate.conflict()
         return (False, frozenset())
 
     # Solved by unitPropagation
     if not cdata.clauses:
-        return (True, interpretation)
+        return satisfied(variables, cdata, interpretation)
 
     # Propagate pure literals
-    pureLiteral(variables, cdata, interpretation, used_vars, cchanges)
+    pure_clauses = ()
+    if sstate.pure_literal_depth is None or \
+            sstate.depth <= sstate.pure_literal_depth:
+        pure_lits = [] if sstate.proof is not None else None
+        pureLiteral(variables, cdata, interpretation, used_vars, cchanges,
+                    pure_lits)
+        if pure_lits:
+            pure_clauses = sstate.learnPure(pure_lits)
+    else:
+        # Deeper nodes only see candidates queued after this point
+        del cdata.pure_candidates[:]
 
     # Solved by pureLiteral
     if not cdata.clauses:
-        return (True, interpretation)
+        return satisfied(variables, cdata, interpretation)
+
+    # Solve every independent component on its own
+    if sstate.components:
+        components = findComponents(variables, cdata)
+
+        if len(components) > 1:
+            res = solveComponents(components, cdata, interpretation,
+                                  heuristic, run_stats, sstate)
+            if not res[0]:
+                unassignVariables(variables, used_vars, cdata)
+                undoClauseChanges(cdata, cchanges)
+                sstate.addUnsat(key, nclauses)
+                sstate.forget(pure_clauses)
+            else:
+                # The components have set their own variables
+                res = satisfied(variables.difference(*components), cdata,
+                                interpretation)
+
+            return res
 
     # select variable to explore
     var = heuristic(variables, cdata)
 
-    used_vars.add(abs(var))
-    variables.remove(abs(var))
+    # Lookahead heuristics report the failed literals found while probing.
+    # Their negation is implied by the current assignment, so it is set
+    # without branching and the search goes on from the simplified formula
+    failed = getattr(heuristic, 'failed_literals', None)
+    if failed:
+        # Probing them reached an empty clause by unit propagation
+        for l in failed:
+            sstate.learn([-l])
+
+        first = len(cchanges.mclauses)
+        if assignLiterals([-l for l in failed], variables, cdata,
+                          interpretation, used_vars, cchanges):
+            res = (False, frozenset())
+            sstate.conflict()
+        else:
+            res = _solve(variables, cdata, interpretation, heuristic,
+                         run_stats, sstate, [-l for l in failed] +
+                         newUnits(cdata, cchanges, first))
+
+        if not res[0]:
+            unassignVariables(variables, used_vars, cdata)
+            undoClauseChanges(cdata, cchanges)
+            sstate.addUnsat(key, nclauses)
+            sstate.forget(pure_clauses)
+
+        return res
+
+    # After a restart, branch first on the last polarity of the variable
+    if sstate.phases is not None and sstate.phases[abs(var)] is not None:
+        var = abs(var) if sstate.phases[abs(var)] else -abs(var)
+
+    if sstate.tracer is not None:
+        sstate.tracer.decision(var, getattr(heuristic, 'action', -1),
+                               len(used_vars))
+
+    assignVariable(abs(var), variables, used_vars, cdata)
 
     run_stats.add_split()
 
     # Recursive Call, internally recovers state between branches
     # if the return value of a branch is unsatisfiable
-    res =  dpllBranch(var, variables, cdata, interpretation, heuristic, run_stats)
+    res =  dpllBranch(var, variables, cdata, interpretation, heuristic,
+                      run_stats, sstate)
 
     # Recover Unit Propagatin and Pure Literal changes
     if not res[0]:
-        variables.update(used_vars)
+        unassignVariables(variables, used_vars, cdata)
         undoClauseChanges(cdata, cchanges)
+        sstate.addUnsat(key, nclauses)
+        sstate.forget(pure_clauses)
 
     return res
 
 
-def dpllBranch(var, variables, cdata, interpretation, heuristic, run_stats):
+def satisfied(variables, cdata, interpretation):
+    """
+    Returns the result of a node whose clauses are all satisfied. The
+    unassigned members of the at-most-one groups are set to False, the
+    interpretation may still have the values of branches that were undone
+    """
+    if cdata.implications is not None:
+        for group in cdata.implications.groups:
+            for lit in group:
+                if abs(lit) in variables:
+                    interpretation[abs(lit)] = lit < 0
+
+    return (True, interpretation)
+
+
+def dpllBranch(var, variables, cdata, interpretation, heuristic, run_stats,
+               sstate):
 
     """
     Explore all the search space with var = True and var = False until
     a solution or empty clause are found
+
+    var is a literal, its polarity is explored first
     """
     nvar = -var
+    avar = abs(var)
     br_cchanges = ClausesChanges(set(), [])
 
-    # Truth value for var = True
-    interpretation[var] = True
-    if not removeLiteralFromClauses(nvar, cdata, br_cchanges):
-        removeClausesWithLiteral(var, cdata, br_cchanges)
-        res = _solve(variables, cdata, interpretation, heuristic, run_stats)
+    # Literal var = True
+    interpretation[avar] = var > 0
+    if not setLiteral(var, cdata, br_cchanges):
+        sstate.depth += 1
+        sstate.path.append(var)
+        res = _solve(variables, cdata, interpretation, heuristic, run_stats,
+                     sstate, [var] + newUnits(cdata, br_cchanges))
+        sstate.path.pop()
+        sstate.depth -= 1
 
         # Solution found. Do not undo changes
         if res[0]:
             return res
+    else:
+        sstate.conflict()
+
+    sstate.learn([nvar])
 
     undoClauseChanges(cdata, br_cchanges)
     br_cchanges = ClausesChanges(set(), [])
 
-    # Truth value for var = False
-    interpretation[var] = False
-    if not removeLiteralFromClauses(var, cdata, br_cchanges):
-        removeClausesWithLiteral(nvar, cdata, br_cchanges)
-        res = _solve(variables, cdata, interpretation, heuristic, run_stats)
+    # Literal var = False
+    interpretation[avar] = var < 0
+    if not setLiteral(nvar, cdata, br_cchanges):
+        sstate.depth += 1
+        sstate.path.append(nvar)
+        res = _solve(variables, cdata, interpretation, heuristic, run_stats,
+                     sstate, [nvar] + newUnits(cdata, br_cchanges))
+        sstate.path.pop()
+        sstate.depth -= 1
 
         # Solution found. Do not undo changes
         if res[0]:
 
             return res
+    else:
+        sstate.conflict()
+
+    sstate.learn([var])
 
     undoClauseChanges(cdata, br_cchanges)
 
@@ -141,15 +550,39 @@ def dpllBranch(var, variables, cdata, interpretation, heuristic, run_stats):
     return (False, frozenset())
 
 
-def unitPropagation(variables, cdata, interpretation, used_vars, cchanges):
+def setLiteral(lit, cdata, cchanges):
+    """
+    Sets lit to True in the clauses and logs the changes. Does not touch
+    the variables or the interpretation
+
+    Returns True if an empty clause is reached, False otherwise
+    """
+    if cdata.litclauses.has_key(-lit):
+        if removeLiteralFromClauses(-lit, cdata, cchanges):
+            return True
+
+    if cdata.litclauses.has_key(lit):
+        removeClausesWithLiteral(lit, cdata, cchanges)
+
+    return False
+
+
+def unitPropagation(variables, cdata, interpretation, used_vars, cchanges,
+                    pending=()):
     """
     Search for clauses with only one literal and then remove the unnecessary
     information
 
     This is an special version for DPLL that logs all the changes
 
+    With implication lists, the pending literals are propagated through
+    them too. Otherwise they are ignored, the clauses already reflect them
+
     Returns True as soon as an emtpy clause is reached, False otherwise
     """
+    if cdata.implications is not None:
+        return implicationPropagation(variables, cdata, interpretation,
+                                      used_vars, cchanges, pending)
 
     unit_lits = [iter(c).next() for c in cdata.clauses if len(c) == 1]
 
@@ -166,8 +599,7 @@ def unitPropagation(variables, cdata, interpretation, used_vars, cchanges):
 
         # Remove te used variable
         var = abs(lit)
-        variables.remove(var)
-        used_vars.add(var)
+        assignVariable(var, variables, used_vars, cdata)
 
         # Save interpretation
         interpretation[var] = lit > 0
@@ -179,43 +611,365 @@ def unitPropagation(variables, cdata, interpretation, used_vars, cchanges):
     return False
 
 
-def pureLiteral(variables, cdata, interpretation, used_vars, cchanges):
+def findComponents(variables, cdata):
+    """
+    Groups the variables that still appear in the formula into connected
+    components, two variables are connected if they share a clause
+
+    Returns a list with a set of variables per component
+    """
+    seen = set()
+    visited = set()
+    components = []
+
+    for v in variables:
+        if v in seen:
+            continue
+        if not cdata.litclauses.has_key(v) and \
+                not cdata.litclauses.has_key(-v):
+            continue
+
+        seen.add(v)
+        component = set([v])
+        stack = [v]
+
+        while stack:
+            x = stack.pop()
+
+            for lit in (x, -x):
+                for clause in cdata.litclauses.get(lit, ()):
+                    if clause in visited:
+                        continue
+                    visited.add(clause)
+
+                    for l in clause:
+                        y = abs(l)
+                        if y not in seen:
+                            seen.add(y)
+                            component.add(y)
+                            stack.append(y)
+
+                # At-most-one groups also connect their variables
+                if cdata.implications is not None:
+                    for l in cdata.implications.groupNeighbours(lit):
+                        y = abs(l)
+                        if y not in seen and y in variables:
+                            seen.add(y)
+                            component.add(y)
+                            stack.append(y)
+
+        components.append(component)
+
+    return components
+
+
+def componentData(component, cdata):
+    """
+    Returns a new ClausesData with only the clauses of the component
+    """
+    clauses = set()
+    litclauses = {}
+
+    for v in component:
+        for lit in (v, -v):
+            if cdata.litclauses.has_key(lit):
+                litclauses[lit] = set(cdata.litclauses[lit])
+                clauses.update(litclauses[lit])
+
+    ctimes = { c : cdata.ctimes[c] for c in clauses }
+
+    # Entries of clauses out of the component are ignored since they do not
+    # appear in ctimes
+    # Components are not looked up in the unsat cache, the hash of their
+    # clauses is not maintained. The pure literals of the formula have
+    # already been eliminated, so there are no candidates
+    return ClausesData(clauses, ctimes, litclauses, cdata.implications, None,
+                       [])
+
+
+def solveComponents(components, cdata, interpretation, heuristic, run_stats,
+                    sstate):
+    """
+    Solves every component with its own copy of the clause data, so cdata
+    is not modified. The smallest components are solved first and the
+    search stops as soon as one of them is unsatisfiable
+    """
+    solved = []
+
+    for component in sorted(components, key=len):
+        ccdata = componentData(component, cdata)
+
+        cvariables = set(component)
+        res = _solve(cvariables, ccdata, interpretation, heuristic,
+                     run_stats, sstate)
+        if not res[0]:
+            # The components already solved keep their assignment, give
+            # their variables back to the at-most-one groups
+            if cdata.implications is not None:
+                for scomponent, svariables in solved:
+                    for var in scomponent - svariables:
+                        cdata.implications.unassign(var)
+            return res
+
+        solved.append((component, cvariables))
+
+    return (True, interpretation)
+
+
+def assignVariable(var, variables, used_vars, cdata):
+    """
+    Moves var from the unassigned variables to used_vars, the variables
+    assigned by the current node
+    """
+    variables.remove(var)
+    used_vars.add(var)
+
+    if cdata.implications is not None:
+        cdata.implications.assign(var)
+
+
+def unassignVariables(variables, used_vars, cdata):
+    """
+    Gives back the variables assigned by a node, see assignVariable
+    """
+    variables.update(used_vars)
+
+    if cdata.implications is not None:
+        for var in used_vars:
+            cdata.implications.unassign(var)
+
+
+def assignLiterals(lits, variables, cdata, interpretation, used_vars,
+                   cchanges):
+    """
+    Sets every literal in lits to True and logs all the changes
+
+    Returns True as soon as an empty clause or a contradictory pair of
+    literals is found, False otherwise
+    """
+    for lit in lits:
+        var = abs(lit)
+
+        # Already assigned by a previous literal of the list
+        if var not in variables:
+            if interpretation[var] != (lit > 0):
+                return True
+            continue
+
+        if cdata.litclauses.has_key(lit):
+            removeClausesWithLiteral(lit, cdata, cchanges)
+
+        if cdata.litclauses.has_key(-lit):
+            if removeLiteralFromClauses(-lit, cdata, cchanges):
+                return True
+
+        assignVariable(var, variables, used_vars, cdata)
+        interpretation[var] = lit > 0
+
+    return False
+
+
+def propagateLiteral(lit, cdata, cchanges):
+    """
+    Sets lit to True and propagates all the unit clauses that appear,
+    logging the changes. Does not touch the variables or the interpretation
+    so it can be used to probe a literal and undo the changes afterwards
+
+    Returns True if an empty clause is reached, False otherwise
+    """
+    assigned = set()
+    units = [lit]
+
+    while units:
+        l = units.pop()
+
+        if l in assigned:
+            continue
+        if -l in assigned:
+            return True
+        assigned.add(l)
+
+        first = len(cchanges.mclauses)
+
+        if cdata.litclauses.has_key(l):
+            removeClausesWithLiteral(l, cdata, cchanges)
+
+        if cdata.litclauses.has_key(-l):
+            if removeLiteralFromClauses(-l, cdata, cchanges):
+                return True
+
+        # Only the clauses shortened by this literal can be new units
+        for nc, _, _ in cchanges.mclauses[first:]:
+            if len(nc) == 1:
+                units.append(iter(nc).next())
+
+        if cdata.implications is not None:
+            units.extend(-m for m in cdata.implications.groupNeighbours(l))
+
+    return False
+
+
+def probeLiteral(lit, cdata):
+    """
+    Tentatively sets lit to True, propagates it and restores the formula
+
+    Returns a tuple (failed, reduction) where failed is True if the
+    propagation reached an empty clause and reduction is the amount of
+    clauses satisfied or shortened by the propagation
+    """
+    cchanges = ClausesChanges(set(), [])
+
+    failed = propagateLiteral(lit, cdata, cchanges)
+    reduction = len(cchanges.rclauses) + len(cchanges.mclauses)
+
+    undoClauseChanges(cdata, cchanges)
+
+    return failed, reduction
+
+
+def implicationPropagation(variables, cdata, interpretation, used_vars,
+                           cchanges, pending=()):
+    """
+    Version of unitPropagation for formulas with binary implication lists.
+
+    The pending units are first closed over the binary clauses, looking
+    only at the implication lists, so conflicts between binary clauses are
+    found without modifying the clauses. Then the closure is assigned and
+    the new units are taken from the clauses it shortened, instead of
+    looking for them in the whole formula
+
+    pending are the literals set by the caller and the unit clauses that
+    setting them produced (see newUnits). The formula had no other unit
+    clauses, so the whole formula is only scanned when there are none, at
+    the root of a search
+
+    Returns True as soon as an emtpy clause is reached, False otherwise
+    """
+    if pending:
+        unit_lits = list(pending)
+    else:
+        unit_lits = [iter(c).next() for c in cdata.clauses if len(c) == 1]
+
+    while unit_lits:
+        lits = binaryClosure(unit_lits, cdata)
+        if lits is None:
+            return True
+
+        first = len(cchanges.mclauses)
+
+        if assignLiterals(lits, variables, cdata, interpretation, used_vars,
+                          cchanges):
+            return True
+
+        unit_lits = newUnits(cdata, cchanges, first)
+
+    return False
+
+
+def newUnits(cdata, cchanges, first=0):
+    """
+    Returns the literals of the unit clauses made by the changes logged
+    in cchanges.mclauses from position first that are still in the formula
+    """
+    return [iter(nc).next() for nc, _, _ in cchanges.mclauses[first:]
+            if len(nc) == 1 and cdata.ctimes[nc] > 0]
+
+
+def xorPropagation(variables, cdata, interpretation, used_vars, cchanges,
+                   xor_list):
+    """
+    Alternates gaussian elimination over the xor constraints and unit
+    propagation until no more literals are implied. Logs all the changes
+
+    Returns True as soon as a conflict is found, False otherwise
+    """
+    while True:
+        implied = xors.gaussianElimination(xor_list, variables,
+                                           interpretation)
+        if implied is None:
+            return True
+        if not implied:
+            return False
+
+        first = len(cchanges.mclauses)
+        if assignLiterals(implied, variables, cdata, interpretation,
+                          used_vars, cchanges):
+            return True
+
+        if unitPropagation(variables, cdata, interpretation, used_vars,
+                           cchanges, implied + newUnits(cdata, cchanges,
+                                                        first)):
+            return True
+
+
+def binaryClosure(lits, cdata):
+    """
+    Returns the list of literals implied by lits through the binary clauses
+    of the formula, or None if a literal and its negation are implied
+    """
+    assigned = set()
+    closure = []
+    stack = list(lits)
+
+    while stack:
+        l = stack.pop()
+
+        if l in assigned:
+            continue
+        if -l in assigned:
+            return None
+
+        assigned.add(l)
+        closure.append(l)
+        stack.extend(cdata.implications.implied(l, cdata.ctimes))
+
+    return closure
+
+
+def pureLiteral(variables, cdata, interpretation, used_vars, cchanges,
+                assigned=None):
     """
     Search for pure literals and then remove the unnecessary information and
     logs all the changes
-    """
 
-    # Fill pure_lits with all the pure literals in the formula
-    pure_lits = set()
+    Once the pure literals of a node are gone, a literal can only become
+    pure when the last clause of its negation is removed. The clause sets
+    of cdata.litclauses are the occurrence counters of the literals, and
+    removeClausesWithLiteral queues the negation of every literal whose set
+    becomes empty. Only the queued literals are checked, the candidates
+    queued in branches that were undone are discarded here
 
-    for v in variables:
-        if datautil.isPureLiteral(v, cdata.litclauses):
-            pure_lits.add(v)
-        elif datautil.isPureLiteral(-v, cdata.litclauses):
-            pure_lits.add(-v)
-
-    # Remove clauses with pure lits
-    while pure_lits:
-        pl = pure_lits.pop()
+    The pure literals are appended to assigned, if given, in the order they
+    are set
+    """
+    candidates = cdata.pure_candidates
+
+    # Removing the clauses of a pure literal queues new candidates
+    while candidates:
+        pl = candidates.pop()
         var = abs(pl)
-        variables.remove(var)
-        used_vars.add(var)
+
+        if var not in variables or not isPure(pl, cdata):
+            continue
+
+        assignVariable(var, variables, used_vars, cdata)
 
         # Save interpretation
         interpretation[var] = pl > 0
 
-        # This comprovation avoids an exception when a clause have more than
-        # one pure literal (otherwise the algorithm tries to delete it twice)
-        if cdata.litclauses.has_key(pl):
-            removeClausesWithLiteral(pl, cdata, cchanges)
+        if assigned is not None:
+            assigned.append(pl)
+
+        removeClausesWithLiteral(pl, cdata, cchanges)
+
 
-        # Check if the last propagations genereted more pure literals
-        if not pure_lits:
-            for v in variables:
-                if datautil.isPureLiteral(v, cdata.litclauses):
-                    pure_lits.add(v)
-                elif datautil.isPureLiteral(-v, cdata.litclauses):
-                    pure_lits.add(-v)
+def isPure(lit, cdata):
+    """
+    Returns true if lit is a pure literal. A literal of an at-most-one
+    group is never pure, the group behaves as clauses with its negation
+    """
+    return datautil.isPureLiteral(lit, cdata.litclauses) and \
+        (cdata.implications is None or not cdata.implications.inGroup(lit))
 
 
 def removeClausesWithLiteral(lit, cdata, cchanges):
@@ -230,15 +984,20 @@ def removeClausesWithLiteral(lit, cdata, cchanges):
         # Remove clause
         cdata.clauses.remove(clause)
         cdata.ctimes[clause] = 0
+        if cdata.fhash is not None:
+            cdata.fhash.toggle(clause)
 
         # Remove the clause from literal's local sets
         for l in clause:
             if l != lit:
                 lset = cdata.litclauses[l]
                 lset.remove(clause)
-                # If empty set for literal l remove its local set
+                # If empty set for literal l remove its local set, its
+                # negation may be pure now
                 if not lset:
                     del cdata.litclauses[l]
+                    if cdata.pure_candidates is not None:
+                        cdata.pure_candidates.append(-l)
 
     del cdata.litclauses[lit]
 
@@ -261,6 +1020,10 @@ def removeLiteralFromClauses(lit, cdata, cchanges):
         cdata.clauses.remove(clause)
         cdata.clauses.add(nc)
 
+        # Clauses that become binary join the implication lists
+        if len(nc) == 2 and cdata.implications is not None:
+            cdata.implications.add(nc)
+
         # Update times
         cdata.ctimes[clause] = 0
         try:
@@ -268,6 +1031,12 @@ def removeLiteralFromClauses(lit, cdata, cchanges):
         except KeyError:
             cdata.ctimes[nc] = 1
 
+        # The old clause leaves the formula, nc joins it if it was not there
+        if cdata.fhash is not None:
+            cdata.fhash.toggle(clause)
+            if cdata.ctimes[nc] == 1:
+                cdata.fhash.toggle(nc)
+
         # Update clause on literal's local sets
         for l in nc:
             lset = cdata.litclauses[l]
@@ -289,6 +1058,9 @@ def readdRemovedClauses(cdata, cchanges):
     Add all the clauses removed on a previous call to removeClausesWithLiteral
     """
     for clause, t in cchanges.rclauses:
+        if cdata.fhash is not None and not cdata.ctimes.get(clause):
+            cdata.fhash.toggle(clause)
+
         cdata.clauses.add(clause)
         cdata.ctimes[clause] = t
 
@@ -311,8 +1083,13 @@ def undoModifiedClauses(cdata, cchanges):
         cdata.ctimes[nclause] -= 1
         if cdata.ctimes[nclause] == 0:
             cdata.clauses.remove(nclause)
+            if cdata.fhash is not None:
+                cdata.fhash.toggle(nclause)
 
         # Add the old clause
+        if cdata.fhash is not None and not cdata.ctimes.get(clause):
+            cdata.fhash.toggle(clause)
+
         cdata.clauses.add(clause)
         cdata.ctimes[clause] = t
 
@@ -335,7 +1112,10 @@ def getVarsAndFirstIntp(num_variables, cdata):
     variables = set()
     interpretation = [None]
     for v in xrange(1, num_variables+1):
-        if cdata.litclauses.has_key(v) or cdata.litclauses.has_key(-v):
+        if cdata.litclauses.has_key(v) or cdata.litclauses.has_key(-v) or \
+                (cdata.implications is not None and
+                 (cdata.implications.inGroup(v) or
+                  cdata.implications.inGroup(-v))):
             variables.add(v)
             interpretation.append(None)
         else:
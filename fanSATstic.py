@@ -5,13 +5,33 @@ import argparse
 import datautil
 import traceback
 import heuristics
+import restarts
+import localsearch
+import modelcount
+import symmetry
+import runstore
+import certificates
+import tracer
+import replay
+import os
+import sys
+import time
+import pickle
 import numpy as np
-from rl_agent import ReplayBuf, Estimator, make_state
+from rl_agent import ReplayBuf, Estimator, QuerySchedule, BackgroundTrainer
+from rl_agent import make_state
+from runstore import RunStats
 
 
 # List of possible algorithms
 DPLL = 'dpll'
+WALKSAT = 'walksat'
+PROBSAT = 'probsat'
 systematic_search_algs = [DPLL]
+local_search_algs = {
+                    WALKSAT : localsearch.walkSAT,
+                    PROBSAT : localsearch.probSAT
+                    }
 
 __description__='FanSATstic'
 
@@ -24,6 +44,7 @@ JWOS = 'jwos'
 JWTS = 'jwts'
 DLCS = 'dlcs'
 DLIS = 'dlis'
+LOOKAHEAD = 'lookahead'
 var_selection_heuristics = {
                     MOST_OFTEN : heuristics.mostOftenVariable,
                     MOST_EQUILIBRATED : heuristics.mostEqulibratedVariable,
@@ -31,81 +52,228 @@ var_selection_heuristics = {
                     JWOS : heuristics.jwOS,
                     JWTS : heuristics.jwTS,
                     DLCS : heuristics.dlcs,
-                    DLIS : heuristics.dlis
+                    DLIS : heuristics.dlis,
+                    # Its cache is cleared at the start of every search
+                    LOOKAHEAD : heuristics.Lookahead()
                                 }
 
+# Restart policies, built from the variable selection heuristic
+NO_RESTARTS = 'none'
+LUBY = 'luby'
+GEOMETRIC = 'geometric'
+AGENT = 'agent'
+restart_policies = {
+                    NO_RESTARTS : lambda heuristic: None,
+                    LUBY : lambda heuristic: restarts.LubyRestarts(),
+                    GEOMETRIC : lambda heuristic: restarts.GeometricRestarts(),
+                    AGENT : restarts.ActionRestarts
+                    }
+
 # Some output formats
 SATISFIABLE_OUT = "s SATISFIABLE"
 UNSATISFIABLE_OUT = "s UNSATISFIABLE"
+UNKNOWN_OUT = "s UNKNOWN"
+MODEL_COUNT_OUT = "s mc"
+
 
+def main(options):
+    if options.count:
+        num_vars, clauses = datautil.parseCNF(options.file)
+        count = modelcount.countModels(num_vars, clauses,
+                            var_selection_heuristics[options.vselection],
+                            RunStats())
+        print("%s %d" % (MODEL_COUNT_OUT, count))
+        return
+
+    if options.algorithm in local_search_algs:
+        num_vars, clauses = datautil.parseCNF(options.file)
+        sat, interpretation = local_search_algs[options.algorithm](num_vars,
+                                                                   clauses)
+        if sat:
+            certificates.writeModel(sys.stdout, interpretation[1:])
+        else:
+            print(UNKNOWN_OUT)
+        return
 
-class RunStats(object):
-    def __init__(self):
-        self.n_episodes = 0
-        self.n_splits = 0
-        self.episode_stats = []
+    # Symmetry breaking clauses are computed once and reused every episode
+    formula = None
+    if options.symmetry:
+        formula = symmetryBrokenFormula(options.file)
 
+    # One row per episode, a chunk per training run instead of a file per
+    # restart. The rows of an interrupted run are written too
+    with runstore.RunStatsWriter(options.stats_dir) as stats_writer:
+        for restart in range(options.training_runs):
+            trainAgent(options, restart, stats_writer, formula)
 
-    def finish_episode(self):
-        self.episode_stats.append(self.n_splits)
-        self.n_splits = 0
-        self.n_episodes += 1
+    # Agent of the last restart, batchsolve.py can use it as a heuristic
+    if options.save_policy is not None:
+        with open(options.save_policy, 'wb') as f:
+            pickle.dump(q_l_agent, f)
 
-    def add_split(self):
-        self.n_splits += 1
+    #np.save("state_var/state_list",
+    #            np.asarray(state_list),
+    #            allow_pickle=True, fix_imports=True)
 
 
-def main(options):
+        #print formatSystematicSearchResult(res)
+
+
+def trainAgent(options, seed, stats_writer=None, formula=None):
+    """
+    Trains a new agent from scratch during options.episodes episodes over
+    options.file, with the hyperparameters given by options. Every episode
+    is appended to stats_writer, if given, and flushed at the end
+
+        - formula: (num_vars, clauses) solved in every episode, a copy of
+                   the clauses is used each time. By default the cnf file
+                   is parsed again (with the symmetry breaking clauses if
+                   options.symmetry)
+
+    Returns the RunStats of the episodes
+    """
     global state_list
+    global replay_buf
+    global q_l_agent
+    global epsilon
+    global query_schedule
+    global trainer
+
     state_list = []
 
-    n_restarts = 30
-    for restart in range(n_restarts):
-        np.random.seed(restart)
+    if formula is None and options.symmetry:
+        formula = symmetryBrokenFormula(options.file)
 
-        global replay_buf
-        global q_l_agent
-        global epsilon
-        replay_buf = ReplayBuf(30000, 13, n_actions=4)
-        q_l_agent = Estimator(replay_buf)
-        run_stats = RunStats()
+    np.random.seed(seed)
 
-        n_episodes = 100
-        epsilon = 1
-        for i in range(n_episodes):
+    replay_buf = ReplayBuf(options.replay_len, 13, n_actions=options.actions)
+    q_l_agent = Estimator(replay_buf, options.learning_rate)
 
+    # Training in the background overlaps with the next episode
+    trainer = None
+    if options.async_train:
+        trainer = BackgroundTrainer(q_l_agent)
 
-            epsilon = epsilon*0.97
-            q_l_agent.train(discount_factor = 0.999, replay_buf = replay_buf)
+    query_schedule = QuerySchedule(options.query_every,
+                                   options.query_depth,
+                                   options.query_change)
+    run_stats = RunStats()
 
+    # Residual formulas proven unsat, shared by all the episodes. The
+    # at-most-one groups and xors are not part of the formula hash
+    unsat_cache = None
+    if options.unsat_cache > 0 and not (options.at_most_one or
+                                        options.xors):
+        unsat_cache = datautil.LRUCache(options.unsat_cache)
 
-            num_vars, clauses = datautil.parseCNF(options.file)
-            res = None
-            res = dpll.solve(num_vars,
-                             clauses,
-                             automatic_heuristic,
-                             run_stats)
+    for directory in (options.trace_dir, options.record_decisions):
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
 
-            print("Ep {}  done in {} splits".format(i, run_stats.n_splits ))
+    epsilon = 1
+    for i in range(options.episodes):
 
-            replay_buf.game_over()
 
-            run_stats.finish_episode()
+        epsilon = epsilon*options.epsilon_decay
+        if trainer is None:
+            q_l_agent.train(discount_factor = options.discount,
+                            replay_buf = replay_buf)
+        else:
+            trainer.start(discount_factor = options.discount,
+                          replay_buf = replay_buf)
 
-        np.save("run_stats/run_stats"+str(restart),
-                    np.asarray(run_stats.episode_stats),
-                    allow_pickle=True, fix_imports=True)
 
-    #np.save("state_var/state_list",
-    #            np.asarray(state_list),
-    #            allow_pickle=True, fix_imports=True)
+        if formula is not None:
+            num_vars, clauses = formula[0], set(formula[1])
+        else:
+            num_vars, clauses = datautil.parseCNF(options.file)
+        search_tracer = None
+        if options.trace_dir is not None:
+            search_tracer = tracer.SearchTracer(options.trace_buffer,
+                                                options.trace_sample)
+
+        heuristic = automatic_heuristic
+        if options.record_decisions is not None:
+            heuristic = replay.DecisionRecorder(automatic_heuristic)
+
+        res = None
+        start = time.time()
+        res = dpll.solve(num_vars,
+                         clauses,
+                         heuristic,
+                         run_stats,
+                         restart_policies[options.restarts](heuristic),
+                         options.components,
+                         options.binary_implications,
+                         options.at_most_one,
+                         options.xors,
+                         unsat_cache,
+                         options.pure_depth,
+                         tracer=search_tracer)
+        elapsed = time.time() - start
+
+        if search_tracer is not None:
+            writeTrace(search_tracer, os.path.join(options.trace_dir,
+                                                   'run%d-ep%d' % (seed, i)))
+
+        if options.record_decisions is not None:
+            heuristic.save(os.path.join(options.record_decisions,
+                                        'run%d-ep%d.npz' % (seed, i)),
+                           replay.solverMetadata(options))
+
+        print("Ep {}  done in {} splits, {} restarts".format(
+                            i, run_stats.n_splits, run_stats.n_restarts))
+
+        replay_buf.game_over()
+        query_schedule.reset()
+
+        if stats_writer is not None:
+            stats_writer.append(options.file, seed, i, run_stats.n_splits,
+                                run_stats.n_restarts, elapsed, epsilon)
+        run_stats.finish_episode()
+
+    if trainer is not None:
+        trainer.wait()
+
+    if stats_writer is not None:
+        stats_writer.flush()
+
+    return run_stats
+
+
+def writeTrace(search_tracer, prefix):
+    """
+    Writes the chrome trace of a search to prefix.trace.json and its per
+    depth histogram to prefix.depth.tsv
+    """
+    search_tracer.writeChromeTrace(prefix + '.trace.json')
+    with open(prefix + '.depth.tsv', 'w') as f:
+        search_tracer.writeDepthHistogram(f)
 
 
-        #print formatSystematicSearchResult(res)
+def symmetryBrokenFormula(fname):
+    """
+    Returns the formula of fname with the lex-leader symmetry breaking
+    clauses added
+    """
+    num_vars, clauses = datautil.parseCNF(fname)
+    num_vars, _ = symmetry.addSymmetryBreaking(num_vars, clauses)
+    return num_vars, clauses
 
 
 def automatic_heuristic(var_range, cdata):
 
+    # Weights trained in the background change between decisions
+    if trainer is not None:
+        trainer.swap()
+
+    # Reuse the last choice of the agent, it keeps collecting the reward
+    if not query_schedule.should_query(var_range, cdata):
+        replay_buf.add_reward(-1)
+        automatic_heuristic.action = query_schedule.action
+        return heuristics.use_heuristic(query_schedule.action,
+                                        var_range, cdata)
+
     s = make_state(var_range, cdata)
 
     state_list.append(s)
@@ -113,9 +281,14 @@ def automatic_heuristic(var_range, cdata):
     action_probs = q_l_agent.policy_eps_greedy(epsilon, s)
     heuristic_id = np.random.choice(np.arange(len(action_probs)), p=action_probs)
     replay_buf.append_s_a_r(s, heuristic_id, -1)
+    query_schedule.queried(heuristic_id, cdata)
 
+    automatic_heuristic.action = heuristic_id
     return heuristics.use_heuristic(heuristic_id, var_range, cdata)
 
+# Action of the last decision, recorded by the search tracer
+automatic_heuristic.action = -1
+
 
 def formatLocalSearchResult(bool_result):
     """
@@ -128,14 +301,9 @@ def formatLocalSearchResult(bool_result):
     s SATISFIABLE
     v 1 -2 -3
     """
-    out = '%s\nv' % SATISFIABLE_OUT
-
-    for ind,b in enumerate(bool_result):
-        if b:
-            out += ' %d' % (ind+1)
-        else:
-            out += ' %d' % (-(ind+1) )
-    return out
+    values = [str(ind+1) if b else str(-(ind+1))
+              for ind, b in enumerate(bool_result)]
+    return '%s\nv %s' % (SATISFIABLE_OUT, ' '.join(values))
 
 
 def formatSystematicSearchResult(result):
@@ -168,6 +336,10 @@ def formatSystematicSearchResult(result):
         del prove[0]
         return formatLocalSearchResult(prove)
 
+    # dpll does not return a core, see the proof option of dpll.solve
+    elif not prove:
+        return UNSATISFIABLE_OUT
+
     else:
         core = []
         biggest_var = 0
@@ -196,23 +368,25 @@ def printComments(comments):
     for comment in comments.splitlines():
         print 'c', comment
 
-
-
-
-#######################
-#                     #
-# Program entry point #
-#                     #
-#######################
-
-if __name__ == '__main__':
-
+#
+#
+def buildParser():
+    """
+    Returns the parser of the command line options
+    """
     parser = argparse.ArgumentParser(description=__description__)
 
 
     parser.add_argument('-f', '--file', action='store', default="",
                     required=True, help='Path to a cnf file')
 
+    parser.add_argument('-a', '--algorithm', action='store', default=DPLL,
+                        choices=systematic_search_algs +
+                                local_search_algs.keys(),
+                        help='Specifies the search algorithm. Local search '
+                        'algorithms can only prove satisfiability. '
+                        'DEFAULT = %s' % DPLL)
+
     parser.add_argument('-vsh', '--vselection', action='store',
                         default=MOST_OFTEN,
                         choices=var_selection_heuristics.keys(),
@@ -220,6 +394,163 @@ if __name__ == '__main__':
                         'These heuristics are used only in the systematic '
                         'search algorithms. DEFAULT = %s' % MOST_OFTEN)
 
+    parser.add_argument('-rs', '--restarts', action='store',
+                        default=NO_RESTARTS,
+                        choices=restart_policies.keys(),
+                        help='Specifies the restart schedule of the systematic '
+                        'search algorithms. After a restart the previous '
+                        'polarities are reused. With %s the search restarts '
+                        'when the agent switches to another heuristic. '
+                        'DEFAULT = %s' % (AGENT, NO_RESTARTS))
+
+    parser.add_argument('-cmp', '--components', action='store_true',
+                        help='Split the residual formula into independent '
+                        'components and solve each one on its own')
+
+    parser.add_argument('-bin', '--binary-implications', action='store_true',
+                        help='Propagate the binary clauses through '
+                        'implication lists')
+
+    parser.add_argument('-amo', '--at-most-one', action='store_true',
+                        help='Replace pairwise at-most-one encodings by '
+                        'native constraints. Implies --binary-implications')
+
+    parser.add_argument('-xor', '--xors', action='store_true',
+                        help='Detect xor constraints encoded in the clauses '
+                        'and propagate them with gaussian elimination')
+
+    parser.add_argument('-pd', '--pure-depth', action='store', type=int,
+                        default=None,
+                        help='Only eliminate pure literals up to this number '
+                        'of decisions, 0 restricts it to the root. By '
+                        'default they are eliminated at every node')
+
+    parser.add_argument('-sym', '--symmetry', action='store_true',
+                        help='Add lex-leader symmetry breaking clauses '
+                        'before solving')
+
+    parser.add_argument('-uc', '--unsat-cache', action='store', type=int,
+                        default=0,
+                        help='Maximum number of unsatisfiable residual '
+                        'formulas remembered between episodes, 0 disables '
+                        'the cache. The episodes after the first one skip '
+                        'the subtrees already refuted, so their splits are '
+                        'not comparable with the ones of a search without '
+                        'it. Not used with --at-most-one or --xors. '
+                        'DEFAULT = 0')
+
+    parser.add_argument('-at', '--async-train', action='store_true',
+                        help='Train the agent in a background thread on '
+                        'snapshots of the replay buffer while the next '
+                        'episode is solved')
+
+    parser.add_argument('-sd', '--stats-dir', action='store',
+                        default='run_stats',
+                        help='Directory of the run statistics store, see '
+                        'runstore.py. DEFAULT = run_stats')
+
+    parser.add_argument('-sp', '--save-policy', action='store', default=None,
+                        help='File where the agent of the last restart is '
+                        'saved once the training finishes')
+
+    parser.add_argument('-tr', '--training-runs', action='store', type=int,
+                        default=30,
+                        help='Number of agents trained from scratch, one '
+                        'per seed. DEFAULT = 30')
+
+    parser.add_argument('-ne', '--episodes', action='store', type=int,
+                        default=100,
+                        help='Number of episodes of every training run. '
+                        'DEFAULT = 100')
+
+    parser.add_argument('-ed', '--epsilon-decay', action='store', type=float,
+                        default=0.97,
+                        help='Factor applied to the exploration rate before '
+                        'every episode. DEFAULT = 0.97')
+
+    parser.add_argument('-df', '--discount', action='store', type=float,
+                        default=0.999,
+                        help='Discount factor of the q-learning targets. '
+                        'DEFAULT = 0.999')
+
+    parser.add_argument('-lr', '--learning-rate', action='store', type=float,
+                        default=0.05,
+                        help='Learning rate of the SGD regressors of the '
+                        'agent. DEFAULT = 0.05')
+
+    parser.add_argument('-rl', '--replay-len', action='store', type=int,
+                        default=30000,
+                        help='Number of transitions kept in the replay '
+                        'buffer. DEFAULT = 30000')
+
+    parser.add_argument('-na', '--actions', action='store', type=int,
+                        default=4, choices=range(1, 8),
+                        help='Number of heuristics the agent chooses from, '
+                        'the first ones of heuristics.use_heuristic. '
+                        'DEFAULT = 4')
+
+    parser.add_argument('-tc', '--trace-dir', action='store', default=None,
+                        help='Directory where the search tree of every '
+                        'episode is written as a chrome trace '
+                        '(runR-epE.trace.json) and a per depth histogram '
+                        '(runR-epE.depth.tsv)')
+
+    parser.add_argument('-ts', '--trace-sample', action='store', type=int,
+                        default=1,
+                        help='Only trace one of every this number of nodes. '
+                        'DEFAULT = 1')
+
+    parser.add_argument('-tb', '--trace-buffer', action='store', type=int,
+                        default=100000,
+                        help='Maximum number of traced nodes kept, the '
+                        'oldest are dropped. DEFAULT = 100000')
+
+    parser.add_argument('-rd', '--record-decisions', action='store',
+                        default=None,
+                        help='Directory where the literals chosen in every '
+                        'episode are saved (runR-epE.npz), replay.py '
+                        'solves it again with them. Can not be used with '
+                        '--unsat-cache')
+
+    parser.add_argument('-mc', '--count', action='store_true',
+                        help='Count the models of the formula instead of '
+                        'searching for one. Uses the variable selection '
+                        'heuristic given by --vselection')
+
+    parser.add_argument('-qk', '--query-every', action='store', type=int,
+                        default=1,
+                        help='Ask the agent for a heuristic every k splits '
+                        'and reuse its last choice in between. DEFAULT = 1')
+
+    parser.add_argument('-qd', '--query-depth', action='store', type=int,
+                        default=None,
+                        help='Do not ask the agent once more than this '
+                        'number of variables have been assigned')
+
+    parser.add_argument('-qc', '--query-change', action='store', type=float,
+                        default=None,
+                        help='Also ask the agent when the number of clauses '
+                        'has changed more than this fraction since the '
+                        'last query')
+
+    return parser
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = buildParser()
     options = parser.parse_args()
 
+    if options.record_decisions is not None and options.unsat_cache > 0:
+        parser.error('the episodes that reuse the unsat cache can not be '
+                     'replayed, --record-decisions needs --unsat-cache 0')
+
     main(options)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import csv
+import json
+import hashlib
+import argparse
+import itertools
+import traceback
+import collections
+import multiprocessing
+import numpy as np
+import datautil
+from batchsolve import collectInstances
+
+
+__description__ = 'Computes instance features of many cnf files in ' \
+                  'parallel, reusing the ones cached for unchanged files'
+
+# Part of the cache key, change it when the features change
+FEATURES_VERSION = 1
+
+# Clauses longer than this are left out of the variable graph, they would
+# add a quadratic number of edges
+MAX_GRAPH_CLAUSE = 64
+
+
+#
+#
+def statistics(prefix, values):
+    """
+    Returns the mean, standard deviation, minimum, maximum and coefficient
+    of variation of values as (name, value) pairs
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        values = np.zeros(1)
+
+    mean = values.mean()
+    std = values.std()
+    return [(prefix + '_mean', mean), (prefix + '_std', std),
+            (prefix + '_min', values.min()), (prefix + '_max', values.max()),
+            (prefix + '_cv', std / mean if mean else 0.0)]
+
+#
+#
+def variableGraphDegrees(num_vars, lengths, variables, offsets):
+    """
+    Returns the degree of every variable in the variable graph, where two
+    variables are adjacent if they appear together in a clause. Clauses of
+    the same length are processed as one matrix
+    """
+    codes = []
+
+    for k in np.unique(lengths):
+        if k < 2 or k > MAX_GRAPH_CLAUSE:
+            continue
+
+        starts = offsets[:-1][lengths == k]
+        block = variables[starts[:, None] + np.arange(k)]
+
+        i, j = np.triu_indices(k, 1)
+        a = block[:, i].ravel()
+        b = block[:, j].ravel()
+
+        # Both directions of every edge, as a single integer
+        codes.append(a * (num_vars + 1) + b)
+        codes.append(b * (num_vars + 1) + a)
+
+    if not codes:
+        return np.zeros(num_vars + 1, dtype=np.int64)
+
+    edges = np.unique(np.concatenate(codes))
+    return np.bincount(edges // (num_vars + 1), minlength=num_vars + 1)
+
+#
+#
+def extractFeatures(num_vars, clauses):
+    """
+    Returns an OrderedDict with the features of the formula:
+
+        - Size: variables, clauses and their ratios
+        - Clause length distribution and fraction of unit, binary, ternary
+          and horn clauses
+        - Fraction of positive literals of the clauses
+        - Occurrences of every variable and balance between its positive
+          and negative occurrences (|pos - neg| / (pos + neg))
+        - Degrees of the variable graph (see variableGraphDegrees)
+
+    Variables that do not appear in any clause are left out of the
+    distributions
+    """
+    clauses = list(clauses)
+    lengths = np.array([len(c) for c in clauses], dtype=np.int64)
+
+    offsets = np.zeros(len(clauses) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    literals = np.fromiter(itertools.chain.from_iterable(clauses),
+                           dtype=np.int64, count=int(offsets[-1]))
+    variables = np.abs(literals)
+    positive = literals > 0
+
+    clause_ids = np.repeat(np.arange(len(clauses)), lengths)
+    n_positive = np.bincount(clause_ids, weights=positive,
+                             minlength=len(clauses))
+
+    pos_occ = np.bincount(variables[positive], minlength=num_vars + 1)[1:]
+    neg_occ = np.bincount(variables[~positive], minlength=num_vars + 1)[1:]
+    occ = pos_occ + neg_occ
+    used = occ > 0
+
+    n_clauses = float(len(clauses))
+    n_used = float(used.sum())
+
+    features = collections.OrderedDict()
+    features['variables'] = num_vars
+    features['used_variables'] = n_used
+    features['clauses'] = n_clauses
+    features['clauses_per_variable'] = n_clauses / n_used if n_used else 0.0
+    features['variables_per_clause'] = n_used / n_clauses if n_clauses else 0.0
+
+    features.update(statistics('clause_length', lengths))
+    for name, k in (('unit', 1), ('binary', 2), ('ternary', 3)):
+        features[name + '_fraction'] = \
+            (lengths == k).sum() / n_clauses if n_clauses else 0.0
+    features['horn_fraction'] = \
+        (n_positive <= 1).sum() / n_clauses if n_clauses else 0.0
+
+    fraction = n_positive / np.maximum(lengths, 1)
+    features.update(statistics('clause_positive_fraction', fraction))
+
+    features.update(statistics('variable_occurrences', occ[used]))
+    balance = np.abs(pos_occ - neg_occ)[used] / occ[used].astype(np.float64)
+    features.update(statistics('variable_balance', balance))
+
+    degrees = variableGraphDegrees(num_vars, lengths, variables, offsets)
+    features.update(statistics('graph_degree', degrees[1:][used]))
+
+    return features
+
+#
+#
+def cachePath(cache_dir, digest):
+    return os.path.join(cache_dir, '%s.v%d.json' % (digest, FEATURES_VERSION))
+
+#
+#
+def fileFeatures(args):
+    """
+    Returns (fname, digest, features, cached) for a cnf file, computing the
+    features only if they are not in the cache. The key of the cache is the
+    sha1 of the content of the file, so renamed or copied files are found
+    too. features is None and the error is returned instead of digest if
+    the file can not be processed
+    """
+    fname, cache_dir = args
+
+    try:
+        with open(fname, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+
+        path = cachePath(cache_dir, digest)
+        try:
+            with open(path) as f:
+                features = json.load(
+                    f, object_pairs_hook=collections.OrderedDict)
+            return fname, digest, features, True
+        except (IOError, ValueError):
+            pass
+
+        num_vars, clauses = datautil.parseCNFLines(content.splitlines(),
+                                                   fname)
+        features = extractFeatures(num_vars, clauses)
+
+        # Written to a temporary file and renamed, a scan that is killed
+        # never leaves half an entry
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(features, f)
+        os.rename(tmp_path, path)
+
+        return fname, digest, features, False
+
+    except Exception:
+        return fname, traceback.format_exc(), None, False
+
+#
+#
+def extractAll(instances, cache_dir, jobs, log=sys.stderr):
+    """
+    Computes the features of the instances with a pool of jobs processes.
+    Returns a list of (fname, digest, features), in the order of instances,
+    and the number of files that failed
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    results = {}
+    cached = 0
+    failed = 0
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for fname, digest, features, hit in pool.imap_unordered(
+                fileFeatures, [(f, cache_dir) for f in instances]):
+            if features is None:
+                failed += 1
+                log.write('c %s failed\n%s' % (fname, digest))
+                continue
+
+            cached += hit
+            results[fname] = (fname, digest, features)
+    finally:
+        pool.terminate()
+
+    log.write('c %d files, %d cached, %d computed, %d failed\n' %
+              (len(instances), cached, len(results) - cached, failed))
+
+    return [results[f] for f in instances if f in results], failed
+
+#
+#
+def writeTable(results, out):
+    """
+    Writes one csv row per file with its features
+    """
+    names = []
+    for _, _, features in results:
+        names.extend(n for n in features if n not in names)
+
+    writer = csv.writer(out)
+    writer.writerow(['instance', 'sha1'] + names)
+    for fname, digest, features in results:
+        writer.writerow([fname, digest] +
+                        ['%.6g' % features[n] if n in features else ''
+                         for n in names])
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('inputs', nargs='*',
+                        help='cnf files, directories or glob patterns')
+
+    parser.add_argument('-m', '--manifest', action='store', default=None,
+                        help='File with the path of one cnf file per line')
+
+    parser.add_argument('-j', '--jobs', action='store', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of files processed at the same time. '
+                        'DEFAULT = number of cpus')
+
+    parser.add_argument('-cd', '--cache-dir', action='store',
+                        default='feature_cache',
+                        help='Directory with the features of the files '
+                        'already seen, by content. DEFAULT = feature_cache')
+
+    parser.add_argument('-o', '--output', action='store',
+                        default='features.csv',
+                        help='csv file with the features of every file. '
+                        'DEFAULT = features.csv')
+
+    options = parser.parse_args()
+
+    instances = collectInstances(options.inputs, options.manifest)
+    if not instances:
+        parser.error('no cnf files found')
+
+    results, failed = extractAll(instances, options.cache_dir, options.jobs)
+
+    with open(options.output, 'wb') as f:
+        writeTable(results, f)
+
+    if failed:
+        sys.exit(1)
@@ -1,4 +1,5 @@
 import numpy as np
+import dpll
 
 # -*- coding: utf-8 -*-
 def use_heuristic(heuristic_id, var_range, cdata):
@@ -26,6 +27,22 @@ def use_heuristic(heuristic_id, var_range, cdata):
         return dlis(var_range, cdata)
 #
 #
+def groupOccurrences(lit, cdata):
+    """
+    groupOccurrences(lit, cdata) -> int
+
+    Returns the number of binary clauses with lit that are represented by
+    at-most-one groups (see cardinality.py) and are still in the residual
+    formula, so that the heuristics count them as if they were still in
+    cdata.litclauses
+    """
+    if cdata.implications is None:
+        return 0
+
+    return cdata.implications.groupOccurrences(lit)
+
+#
+#
 def mostOftenVariable(var_range, cdata):
     """
     mostOftenVariable(var_range, cdata.cdata.litclauses) -> variable
@@ -53,6 +70,8 @@ def mostOftenVariable(var_range, cdata):
         except KeyError:
             pass
 
+        times += groupOccurrences(v, cdata) + groupOccurrences(-v, cdata)
+
         if times > best:
             best = times
             var = v
@@ -89,6 +108,9 @@ def mostEqulibratedVariable(var_range, cdata):
         except KeyError:
             pass
 
+        pvlen += groupOccurrences(v, cdata)
+        nvlen += groupOccurrences(-v, cdata)
+
         eq_value = pvlen * nvlen * 1024 + pvlen + nvlen
 
         if eq_value > best:
@@ -129,6 +151,9 @@ def mom(var_range, cdata):
         except KeyError:
             pass
 
+        pvlen += groupOccurrences(v, cdata)
+        nvlen += groupOccurrences(-v, cdata)
+
         mom_value = pvlen * nvlen + 2**k * (pvlen + nvlen)
 
         if mom_value > best:
@@ -171,6 +196,10 @@ def jwOS(var_range, cdata):
         except KeyError:
             pass
 
+        # Group clauses are binary
+        j_value += 2**(-2) * (groupOccurrences(v, cdata) +
+                              groupOccurrences(-v, cdata))
+
         if j_value > best:
             best = j_value
             var = v
@@ -211,6 +240,10 @@ def jwTS(var_range, cdata):
         except KeyError:
             pass
 
+        # Group clauses are binary
+        jpos_value += 2**(-2) * groupOccurrences(v, cdata)
+        jneg_value += 2**(-2) * groupOccurrences(-v, cdata)
+
         j_value = jpos_value + jneg_value
 
         if j_value > best:
@@ -255,6 +288,10 @@ def dlcs(var_range, cdata):
         except KeyError:
             pass
 
+        vp += groupOccurrences(v, cdata)
+        vn += groupOccurrences(-v, cdata)
+        times = vp + vn
+
         if times > best:
             best = times
             if vp >= vn:
@@ -286,18 +323,129 @@ def dlis(var_range, cdata):
 
         try:
             pvlen = len(cdata.litclauses[v])
-            if pvlen > best:
-                best = pvlen
-                var = v
         except KeyError:
             pass
 
         try:
             nvlen = len(cdata.litclauses[-v])
-            if nvlen > best:
-                best = nvlen
-                var = -v
         except KeyError:
             pass
 
+        pvlen += groupOccurrences(v, cdata)
+        nvlen += groupOccurrences(-v, cdata)
+
+        if pvlen > best:
+            best = pvlen
+            var = v
+
+        if nvlen > best:
+            best = nvlen
+            var = -v
+
     return var
+
+#
+#
+class Lookahead(object):
+    """
+    Lookahead(max_candidates, reuse) -> heuristic
+
+        - max_candidates: Amount of variables probed at every decision. The
+                          candidates are the variables that appear more times
+                          on the formula
+
+        - reuse: Number of decisions a probe result stays in the cache
+
+    Tentatively propagates both polarities of every candidate and returns
+    the variable whose two branches shrink the formula the most
+    [ (reduction(var) + 1) * (reduction(-var) + 1) ], trying first the
+    polarity that reduces it less.
+
+    Literals whose propagation reaches an empty clause are failed literals.
+    They are left in failed_literals after the call, so that the solver
+    can set their negation without branching.
+    """
+
+    def __init__(self, max_candidates=20, reuse=8):
+        self.max_candidates = max_candidates
+        self.reuse = reuse
+        self.decisions = 0
+        self.cache = {}
+        self.failed_literals = []
+
+    def reset(self):
+        self.decisions = 0
+        self.cache.clear()
+        del self.failed_literals[:]
+
+    def probe(self, lit, cdata):
+        """
+        Returns the reduction produced by lit, probing it only if there is
+        no recent result in the cache. Failed literals are always probed
+        again, they may not fail after a backtrack
+        """
+        try:
+            reduction, failed, stamp = self.cache[lit]
+            if not failed and self.decisions - stamp <= self.reuse:
+                return False, reduction
+        except KeyError:
+            pass
+
+        failed, reduction = dpll.probeLiteral(lit, cdata)
+        self.cache[lit] = (reduction, failed, self.decisions)
+
+        return failed, reduction
+
+    def __call__(self, var_range, cdata):
+        self.decisions += 1
+        self.failed_literals = []
+
+        occurrences = []
+        for v in var_range:
+            times = 0
+
+            try:
+                times += len(cdata.litclauses[v])
+            except KeyError:
+                pass
+
+            try:
+                times += len(cdata.litclauses[-v])
+            except KeyError:
+                pass
+
+            times += groupOccurrences(v, cdata) + groupOccurrences(-v, cdata)
+
+            if times:
+                occurrences.append((times, v))
+
+        occurrences.sort(reverse=True)
+
+        var = 0
+        best = -1
+
+        for _, v in occurrences[:self.max_candidates]:
+            pfailed, preduction = self.probe(v, cdata)
+            nfailed, nreduction = self.probe(-v, cdata)
+
+            if pfailed:
+                self.failed_literals.append(v)
+            if nfailed:
+                self.failed_literals.append(-v)
+            if pfailed or nfailed:
+                continue
+
+            value = (preduction + 1) * (nreduction + 1)
+
+            if value > best:
+                best = value
+                if preduction <= nreduction:
+                    var = v
+                else:
+                    var = -v
+
+        # Every candidate failed in some polarity, branch on the first one
+        if not var:
+            var = occurrences[0][1]
+
+        return var
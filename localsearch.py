@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+import random
+import numpy as np
+import satutil
+
+# Random interpretations drawn at every try, the search starts from the one
+# with less false clauses
+START_CANDIDATES = 8
+
+
+class FlipState(object):
+    """
+    Incremental data of a local search over a fixed interpretation
+
+        - interpretation: [None, truth_value1, truth_value2, ...]
+        - truecount[c]: Number of true literals of the clause c
+        - truexor[c]: Xor of the variables of the true literals of c. When
+                      truecount[c] == 1 it is the only true variable
+        - breaks[v]: Number of clauses that become false when v is flipped
+        - makes[v]: Number of false clauses that become true when v is
+                    flipped
+        - unsat: List with the false clauses, where[c] is the position of
+                 c in unsat (or -1)
+
+    Clauses are referenced by their index in self.clauses and the clauses
+    of a literal are found in occurrences[lit + num_vars], so a flip only
+    touches the clauses where the flipped variable appears
+    """
+
+    def __init__(self, num_vars, clauses, interpretation):
+        self.num_vars = num_vars
+        self.clauses = [tuple(c) for c in clauses]
+        self.interpretation = interpretation
+
+        self.occurrences = [[] for _ in xrange(2*num_vars + 1)]
+        for ci, clause in enumerate(self.clauses):
+            for lit in clause:
+                self.occurrences[lit + num_vars].append(ci)
+
+        nclauses = len(self.clauses)
+        self.truecount = [0] * nclauses
+        self.truexor = [0] * nclauses
+        self.breaks = [0] * (num_vars + 1)
+        self.makes = [0] * (num_vars + 1)
+        self.unsat = []
+        self.where = [-1] * nclauses
+
+        for ci, clause in enumerate(self.clauses):
+            for lit in clause:
+                if interpretation[abs(lit)] == (lit > 0):
+                    self.truecount[ci] += 1
+                    self.truexor[ci] ^= abs(lit)
+
+            if self.truecount[ci] == 0:
+                self._addUnsat(ci)
+                for lit in clause:
+                    self.makes[abs(lit)] += 1
+
+            elif self.truecount[ci] == 1:
+                self.breaks[self.truexor[ci]] += 1
+
+    def _addUnsat(self, ci):
+        self.where[ci] = len(self.unsat)
+        self.unsat.append(ci)
+
+    def _removeUnsat(self, ci):
+        # Move the last false clause to the position of the removed one
+        pos = self.where[ci]
+        last = self.unsat.pop()
+        if last != ci:
+            self.unsat[pos] = last
+            self.where[last] = pos
+        self.where[ci] = -1
+
+    def flip(self, var):
+        """
+        Flips var and updates the counters of the clauses where it appears
+        """
+        value = self.interpretation[var]
+        self.interpretation[var] = not value
+
+        # Literal that becomes false and literal that becomes true
+        flit = var if value else -var
+        tlit = -flit
+
+        for ci in self.occurrences[flit + self.num_vars]:
+            self.truecount[ci] -= 1
+            self.truexor[ci] ^= var
+
+            if self.truecount[ci] == 0:
+                self.breaks[var] -= 1
+                self._addUnsat(ci)
+                for lit in self.clauses[ci]:
+                    self.makes[abs(lit)] += 1
+
+            elif self.truecount[ci] == 1:
+                self.breaks[self.truexor[ci]] += 1
+
+        for ci in self.occurrences[tlit + self.num_vars]:
+            self.truecount[ci] += 1
+
+            if self.truecount[ci] == 1:
+                self.breaks[var] += 1
+                self._removeUnsat(ci)
+                for lit in self.clauses[ci]:
+                    self.makes[abs(lit)] -= 1
+
+            elif self.truecount[ci] == 2:
+                self.breaks[self.truexor[ci]] -= 1
+
+            self.truexor[ci] ^= var
+
+
+#
+#
+def walkSATPick(fstate, clause, noise):
+    """
+    WalkSAT variable selection: a variable with break 0 if there is any,
+    otherwise a random one with probability noise or the one with the
+    lowest break value
+    """
+    best = []
+    best_break = None
+
+    for lit in clause:
+        var = abs(lit)
+        b = fstate.breaks[var]
+
+        if best_break is None or b < best_break:
+            best_break = b
+            best = [var]
+        elif b == best_break:
+            best.append(var)
+
+    if best_break > 0 and random.random() < noise:
+        return abs(random.choice(clause))
+
+    return random.choice(best)
+
+
+#
+#
+def probSATPick(fstate, clause, cb, eps=1.0):
+    """
+    ProbSAT variable selection: chooses each variable of the clause with
+    probability proportional to (eps + break)^-cb
+    """
+    weights = [(eps + fstate.breaks[abs(lit)]) ** -cb for lit in clause]
+
+    r = random.random() * sum(weights)
+    for lit, w in zip(clause, weights):
+        r -= w
+        if r <= 0:
+            return abs(lit)
+
+    return abs(clause[-1])
+
+
+#
+#
+def localSearch(num_vars, clauses, pick, max_flips, max_tries,
+                candidates=START_CANDIDATES):
+    """
+    Generic stochastic local search: starting from random interpretations,
+    repeatedly flips a variable chosen by pick(fstate, false_clause)
+
+    Every try draws candidates random interpretations, counts their false
+    clauses at once with satutil.batchNumSatisfiedClauses and starts from
+    the best one
+
+    Returns a tuple with the following formats:
+        - If a model is found
+            (True, [None, truth_value1, truth_vaue2, ...] )
+        - Otherwise
+            (False, [None, truth_value1, truth_vaue2, ...] ) with the
+            interpretation that had less false clauses
+    """
+    clauses = list(clauses)
+    best = None
+    best_unsat = len(clauses) + 1
+
+    packed = satutil.packClauses(clauses)
+
+    for _ in xrange(max_tries):
+        starts = np.random.randint(0, 2, (max(1, candidates), num_vars + 1))
+        nsat = satutil.batchNumSatisfiedClauses(packed, starts)
+        interpretation = [None] + \
+            starts[int(np.argmax(nsat)), 1:].astype(bool).tolist()
+        fstate = FlipState(num_vars, clauses, interpretation)
+
+        for _ in xrange(max_flips):
+            if not fstate.unsat:
+                return (True, interpretation)
+
+            ci = random.choice(fstate.unsat)
+            fstate.flip(pick(fstate, fstate.clauses[ci]))
+
+        if not fstate.unsat:
+            return (True, interpretation)
+
+        if len(fstate.unsat) < best_unsat:
+            best_unsat = len(fstate.unsat)
+            best = list(interpretation)
+
+    return (False, best)
+
+
+#
+#
+def walkSAT(num_vars, clauses, noise=0.5, max_flips=100000, max_tries=10):
+    """
+    WalkSAT local search, see localSearch
+    """
+    return localSearch(num_vars, clauses,
+                       lambda fstate, c: walkSATPick(fstate, c, noise),
+                       max_flips, max_tries)
+
+
+#
+#
+def probSAT(num_vars, clauses, cb=2.3, max_flips=100000, max_tries=10):
+    """
+    ProbSAT local search with the polynomial break function, see
+    localSearch. cb = 2.3 is a good value for random 3-SAT
+    """
+    return localSearch(num_vars, clauses,
+                       lambda fstate, c: probSATPick(fstate, c, cb),
+                       max_flips, max_tries)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import dpll
+import datautil
+from dpll import ClausesData, ClausesChanges
+
+
+def countModels(num_variables, clauses, selection_heuristic, run_stats,
+                cache_size=100000):
+    """
+    Counts the models of the formula with a dpll search that splits the
+    residual formula into independent components. The count of every
+    component is stored in a bounded cache so identical sub-formulas are
+    counted only once.
+
+        - cache_size: Maximum number of components in the cache, the least
+                      recently used ones are evicted
+
+    Returns the number of models over the variables 1..num_variables
+    """
+    litclauses = datautil.classifyClausesByLiteral(clauses)
+    ctimes = { c : 1 for c in clauses }
+    cdata = ClausesData(clauses, ctimes, litclauses, None, None, None)
+
+    variables = set(xrange(1, num_variables+1))
+
+    # unitPropagation records the assignments, they are not needed here
+    interpretation = [None] * (num_variables+1)
+
+    cache = datautil.LRUCache(cache_size)
+    dpll.resetHeuristic(selection_heuristic)
+
+    return _count(variables, cdata, interpretation, selection_heuristic,
+                  run_stats, cache)
+
+
+def componentSignature(cdata):
+    """
+    Canonical signature of a component: the set of its residual clauses.
+    It does not depend on the order the clauses were simplified in
+    """
+    return frozenset(cdata.clauses)
+
+
+def _count(variables, cdata, interpretation, heuristic, run_stats, cache):
+    """
+    Returns the number of models of cdata over variables. Restores cdata
+    and variables before returning
+
+    Pure literal elimination is not used, it does not preserve the number
+    of models
+    """
+    used_vars = set()
+    cchanges = ClausesChanges(set(), [])
+
+    if dpll.unitPropagation(variables, cdata, interpretation, used_vars,
+                            cchanges):
+        variables.update(used_vars)
+        dpll.undoClauseChanges(cdata, cchanges)
+        return 0
+
+    if not cdata.clauses:
+        total = 2 ** len(variables)
+    else:
+        components = dpll.findComponents(variables, cdata)
+
+        # Variables without clauses can take any value
+        free = len(variables) - sum(len(c) for c in components)
+        total = 2 ** free
+
+        for component in sorted(components, key=len):
+            if len(components) == 1:
+                ccdata = cdata
+            else:
+                ccdata = dpll.componentData(component, cdata)
+
+            signature = componentSignature(ccdata)
+            count = cache.get(signature)
+
+            if count is None:
+                count = _countComponent(component, ccdata, interpretation,
+                                        heuristic, run_stats, cache)
+                cache.put(signature, count)
+
+            total *= count
+            if not total:
+                break
+
+    variables.update(used_vars)
+    dpll.undoClauseChanges(cdata, cchanges)
+
+    return total
+
+
+def _countComponent(variables, cdata, interpretation, heuristic, run_stats,
+                    cache):
+    """
+    Branches on a variable of a connected component and adds the models of
+    both branches
+    """
+    var = abs(heuristic(variables, cdata))
+    variables.remove(var)
+
+    run_stats.add_split()
+
+    total = 0
+    for lit in (var, -var):
+        br_cchanges = ClausesChanges(set(), [])
+
+        conflict = cdata.litclauses.has_key(-lit) and \
+            dpll.removeLiteralFromClauses(-lit, cdata, br_cchanges)
+
+        if not conflict:
+            if cdata.litclauses.has_key(lit):
+                dpll.removeClausesWithLiteral(lit, cdata, br_cchanges)
+
+            total += _count(variables, cdata, interpretation, heuristic,
+                            run_stats, cache)
+
+        dpll.undoClauseChanges(cdata, br_cchanges)
+
+    variables.add(var)
+
+    return total
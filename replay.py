@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import dpll
+import datautil
+import restarts
+import symmetry
+from runstore import RunStats
+
+
+__description__ = 'Replays the decisions recorded in an episode of ' \
+                  'fanSATstic.py, without the agent, and times the search'
+
+# Same as fanSATstic.restart_policies, that module loads the agent
+restart_policies = {
+    'none': lambda heuristic: None,
+    'luby': lambda heuristic: restarts.LubyRestarts(),
+    'geometric': lambda heuristic: restarts.GeometricRestarts(),
+    'agent': restarts.ActionRestarts
+}
+
+# Options of fanSATstic.py stored with the decisions. The search is only
+# the same if they are the same
+SOLVER_OPTIONS = ['restarts', 'components', 'binary_implications',
+                  'at_most_one', 'xors', 'pure_depth', 'symmetry',
+                  'unsat_cache']
+
+
+class ReplayDivergence(Exception):
+    """
+    Raised when the search asks for a decision that does not match the
+    recorded ones
+    """
+    pass
+
+
+class DecisionRecorder(object):
+    """
+    Variable selection heuristic that records the literals returned by
+    heuristic, in the order the search asks for them. The action of the
+    heuristic, if it has one, is recorded too (see tracer.SearchTracer)
+    """
+    def __init__(self, heuristic):
+        self.heuristic = heuristic
+        self.literals = []
+        self.actions = []
+        self.action = -1
+
+    def __call__(self, var_range, cdata):
+        lit = self.heuristic(var_range, cdata)
+        self.action = getattr(self.heuristic, 'action', -1)
+
+        self.literals.append(lit)
+        self.actions.append(self.action)
+        return lit
+
+    def save(self, path, metadata=None):
+        saveDecisions(path, self.literals, self.actions, metadata)
+
+
+class ReplayHeuristic(object):
+    """
+    Variable selection heuristic that returns the recorded literals in
+    order. Raises ReplayDivergence if the recorded variable is already
+    assigned or there are no decisions left, the search is not the
+    recorded one anymore
+    """
+    def __init__(self, literals, actions=None):
+        self.literals = literals
+        self.actions = actions
+        self.next = 0
+        self.action = -1
+
+    def __call__(self, var_range, cdata):
+        if self.next >= len(self.literals):
+            raise ReplayDivergence('The search asked for more than the %d '
+                                   'recorded decisions' % len(self.literals))
+
+        lit = int(self.literals[self.next])
+        if abs(lit) not in var_range:
+            raise ReplayDivergence('Decision %d: variable %d is already '
+                                   'assigned' % (self.next, abs(lit)))
+
+        if self.actions is not None:
+            self.action = int(self.actions[self.next])
+        self.next += 1
+        return lit
+
+    def finished(self):
+        """
+        Returns True if every recorded decision has been replayed
+        """
+        return self.next == len(self.literals)
+
+#
+#
+def saveDecisions(path, literals, actions, metadata=None):
+    """
+    Writes the decisions as compressed int32 literals and int8 actions,
+    with metadata (a json serializable dictionary)
+    """
+    with open(path, 'wb') as f:
+        np.savez_compressed(f,
+                            literals=np.array(literals, dtype=np.int32),
+                            actions=np.array(actions, dtype=np.int8),
+                            metadata=np.array(json.dumps(metadata or {})))
+
+#
+#
+def loadDecisions(path):
+    """
+    loadDecisions(path) -> (literals, actions, metadata)
+    """
+    with np.load(path) as data:
+        return (data['literals'], data['actions'],
+                json.loads(str(data['metadata'])))
+
+#
+#
+def solverMetadata(options):
+    """
+    Returns the options of dpll.solve of options (see SOLVER_OPTIONS) and the
+    instance, to be saved with the decisions
+    """
+    metadata = dict((name, getattr(options, name)) for name in SOLVER_OPTIONS)
+    metadata['file'] = options.file
+    return metadata
+
+#
+#
+def replayFormula(fname, metadata):
+    """
+    Returns the formula of fname as it was solved in the recorded episode,
+    with the symmetry breaking clauses if they were added
+    """
+    num_vars, clauses = datautil.parseCNF(fname)
+    if metadata.get('symmetry', False):
+        num_vars, _ = symmetry.addSymmetryBreaking(num_vars, clauses)
+    return num_vars, clauses
+
+#
+#
+def replay(num_vars, clauses, literals, actions, metadata, tracer=None):
+    """
+    Solves the formula with the recorded decisions and the recorded solver
+    options. Returns the result of dpll.solve, the RunStats and the seconds
+    of the search
+
+    Raises ValueError if the episode reused the unsat cache of the
+    previous ones, its search can not be repeated on its own
+    """
+    if metadata.get('unsat_cache', 0) > 0:
+        raise ValueError('The episode was solved with the unsat cache of '
+                         'the previous episodes, it can not be replayed')
+
+    heuristic = ReplayHeuristic(literals, actions)
+    run_stats = RunStats()
+
+    start = time.time()
+    res = dpll.solve(num_vars, clauses, heuristic, run_stats,
+                     restart_policies[metadata.get('restarts', 'none')](
+                         heuristic),
+                     metadata.get('components', False),
+                     metadata.get('binary_implications', False),
+                     metadata.get('at_most_one', False),
+                     metadata.get('xors', False),
+                     pure_literal_depth=metadata.get('pure_depth'),
+                     tracer=tracer)
+    elapsed = time.time() - start
+
+    if not heuristic.finished():
+        raise ReplayDivergence('The search finished after %d of the %d '
+                               'recorded decisions' %
+                               (heuristic.next, len(literals)))
+
+    return res, run_stats, elapsed
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('decisions',
+                        help='File written by fanSATstic.py '
+                        '--record-decisions')
+
+    parser.add_argument('-f', '--file', action='store', default=None,
+                        help='Path to a cnf file. DEFAULT = the recorded one')
+
+    parser.add_argument('-r', '--repeat', action='store', type=int,
+                        default=1,
+                        help='Number of times the search is replayed, the '
+                        'best time is reported. DEFAULT = 1')
+
+    options = parser.parse_args()
+
+    literals, actions, metadata = loadDecisions(options.decisions)
+    fname = options.file or metadata.get('file')
+    if not fname:
+        parser.error('no cnf file given')
+
+    times = []
+    for _ in xrange(options.repeat):
+        num_vars, clauses = replayFormula(fname, metadata)
+        try:
+            res, run_stats, elapsed = replay(num_vars, clauses, literals,
+                                             actions, metadata)
+        except ReplayDivergence, e:
+            sys.stderr.write('c replay diverged: %s\n' % e)
+            sys.exit(1)
+        except ValueError, e:
+            parser.error(str(e))
+        times.append(elapsed)
+
+    print('c decisions %d' % len(literals))
+    print('c splits %d' % run_stats.n_splits)
+    print('c restarts %d' % run_stats.n_restarts)
+    print('c time %.6f' % min(times))
+    print('s %s' % ('SATISFIABLE' if res[0] else 'UNSATISFIABLE'))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+#
+#
+def luby(i):
+    """
+    luby(i) -> int
+
+    Returns the i-th element (starting at 1) of the Luby sequence:
+        1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...
+    """
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+
+    return 1 << (k - 1)
+
+
+class RestartPolicy(object):
+    """
+    Base restart policy. Counts the conflicts found since the last restart
+    and asks for a restart when the current limit is reached.
+
+    Subclasses only have to define next_limit()
+    """
+    def __init__(self):
+        self.n_restarts = 0
+        self.conflicts = 0
+        self.limit = self.next_limit()
+
+    def next_limit(self):
+        raise NotImplementedError
+
+    def on_conflict(self):
+        """
+        Called by the solver every time a conflict is found. Returns True
+        if the search has to be restarted
+        """
+        self.conflicts += 1
+        if self.conflicts < self.limit:
+            return False
+
+        self.n_restarts += 1
+        self.conflicts = 0
+        self.limit = self.next_limit()
+        return True
+
+
+class LubyRestarts(RestartPolicy):
+    """
+    Restarts after unit * luby(i) conflicts
+    """
+    def __init__(self, unit=100):
+        self.unit = unit
+        super(LubyRestarts, self).__init__()
+
+    def next_limit(self):
+        return self.unit * luby(self.n_restarts + 1)
+
+
+class GeometricRestarts(RestartPolicy):
+    """
+    Restarts after first * factor^i conflicts
+    """
+    def __init__(self, first=100, factor=1.5):
+        self.first = first
+        self.factor = factor
+        super(GeometricRestarts, self).__init__()
+
+    def next_limit(self):
+        return int(self.first * self.factor ** self.n_restarts)
+
+
+class TriggeredRestarts(RestartPolicy):
+    """
+    Restarts when requested from outside the solver, f.e by the agent
+    choosing the branching heuristic (see ActionRestarts).
+
+        - trigger: Optional callable without arguments queried at every
+                   conflict. The search is restarted when it returns True
+        - first, factor: A request is only granted after first * factor^i
+                         conflicts since the last restart, so the search
+                         still finishes however often it is requested
+    """
+    def __init__(self, trigger=None, first=10, factor=1.5):
+        self.trigger = trigger
+        self.first = first
+        self.factor = factor
+        self.requested = False
+        super(TriggeredRestarts, self).__init__()
+
+    def next_limit(self):
+        return int(self.first * self.factor ** self.n_restarts)
+
+    def request(self):
+        """
+        Restart the search at the next conflict past the limit
+        """
+        self.requested = True
+
+    def on_conflict(self):
+        self.conflicts += 1
+        if self.conflicts < self.limit:
+            return False
+
+        if not self.requested and not (self.trigger and self.trigger()):
+            return False
+
+        self.requested = False
+        self.n_restarts += 1
+        self.conflicts = 0
+        self.limit = self.next_limit()
+        return True
+
+
+class ActionRestarts(TriggeredRestarts):
+    """
+    Restarts when heuristic switches to another action (the action
+    attribute of fanSATstic.automatic_heuristic or rl_agent.GreedyPolicy).
+    The decisions taken with the previous action are undone and the new
+    one starts from the root with the saved polarities
+    """
+    def __init__(self, heuristic, first=10, factor=1.5):
+        self.heuristic = heuristic
+        self.last_action = getattr(heuristic, 'action', -1)
+        super(ActionRestarts, self).__init__(self.switched, first, factor)
+
+    def switched(self):
+        action = getattr(self.heuristic, 'action', -1)
+        if action == self.last_action:
+            return False
+
+        self.last_action = action
+        return True
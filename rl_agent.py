@@ -1,4 +1,7 @@
+import copy
+import threading
 import numpy as np
+import heuristics
 import sklearn
 import sklearn.preprocessing
 import sklearn.pipeline
@@ -70,6 +73,14 @@ class ReplayBuf():
             self.a_current = a_t
             self.r_current = r_t
 
+    def add_reward(self, r_t):
+        """
+        Adds r_t to the reward of the current action. Used when the same
+        action is kept during several steps
+        """
+        if self.s_current is not None:
+            self.r_current += r_t
+
     def game_over(self):
         self.s_current = None
         self.a_current = None
@@ -81,11 +92,71 @@ class ReplayBuf():
         self.index = self.index - n
         self.index = self.index % self.replay_len
 
+    def snapshot(self):
+        """
+        Returns a copy of the buffer that is not modified by later appends
+        """
+        return copy.deepcopy(self)
+
+class QuerySchedule():
+    """
+    Decides when the agent is asked for a new action. Between queries the
+    last action is reused.
+
+    - every_k : query every k decisions (1 queries at every decision)
+    - max_depth : never query deeper than max_depth, measured as the number
+      of variables assigned since the root of the search
+    - change_threshold : also query when the number of clauses has changed
+      more than this fraction since the last query
+    """
+    def __init__(self, every_k=1, max_depth=None, change_threshold=None):
+        self.every_k = every_k
+        self.max_depth = max_depth
+        self.change_threshold = change_threshold
+        self.reset()
+
+    def reset(self):
+        self.action = None
+        self.root_vars = None
+        self.since_query = 0
+        self.n_clauses = 0
+
+    def should_query(self, var_range, cdata):
+        if self.root_vars is None:
+            self.root_vars = len(var_range)
+
+        self.since_query += 1
+
+        if self.action is None:
+            return True
+
+        if self.max_depth is not None and \
+                self.root_vars - len(var_range) > self.max_depth:
+            return False
+
+        if self.every_k is not None and self.since_query >= self.every_k:
+            return True
+
+        if self.change_threshold is not None:
+            change = abs(len(cdata.clauses) - self.n_clauses)
+            return change > self.change_threshold * max(self.n_clauses, 1)
+
+        return False
+
+    def queried(self, action, cdata):
+        """
+        Records the action chosen by the agent
+        """
+        self.action = action
+        self.since_query = 0
+        self.n_clauses = len(cdata.clauses)
+
+
 class Estimator():
     """
     Q-value function approximator.
     """
-    def __init__(self, replay_buf):
+    def __init__(self, replay_buf, eta0=0.05):
         self.n_actions = replay_buf.n_actions
 
         # We create a separate model for each action in the environment's
@@ -95,7 +166,7 @@ class Estimator():
         self.poly = PolynomialFeatures(2)
 
         for _ in range(self.n_actions):
-            model = SGDRegressor(learning_rate="constant", eta0 =0.05)
+            model = SGDRegressor(learning_rate="constant", eta0=eta0)
             # We need to call partial_fit once to initialize the model
             # or we get a NotFittedError when trying to make a prediction
             # This is quite hacky.
@@ -124,6 +195,12 @@ class Estimator():
         else:
             return self.models[a].predict(s)[0]
 
+    def clone(self):
+        """
+        Returns an independent copy of the estimator and its models
+        """
+        return copy.deepcopy(self)
+
     def update(self, s, a, y):
         """
         Updates the estimator parameters for a given state and action towards
@@ -165,3 +242,87 @@ class Estimator():
                 q_values_next = self.predict(replay_buf.s_t_plus_1[action_index])
                 td_target = replay_buf.reward[action_index] + discount_factor * np.max(q_values_next)
                 self.update(replay_buf.s_t[action_index, :], a, td_target)
+
+
+class BackgroundTrainer():
+    """
+    Trains an Estimator in a background thread while the solver runs.
+
+    Every training works on a snapshot of the replay buffer and a clone of
+    the estimator, so the solver keeps using the old weights meanwhile.
+    When the training finishes the new models are kept aside until swap()
+    installs them, so they only change between decisions.
+
+    The sklearn fits release the GIL, so training overlaps with the search
+    """
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.thread = None
+        self.trained = None
+        self.lock = threading.Lock()
+
+    def start(self, discount_factor, replay_buf):
+        """
+        Starts a training on a snapshot of replay_buf. Does nothing if the
+        previous training is still running
+
+        Returns True if a training was started
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return False
+
+        # Train from the latest weights
+        self.swap()
+
+        self.thread = threading.Thread(target=self._train,
+                                       args=(self.estimator.clone(),
+                                             discount_factor,
+                                             replay_buf.snapshot()))
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def _train(self, estimator, discount_factor, replay_buf):
+        estimator.train(discount_factor, replay_buf)
+        with self.lock:
+            self.trained = estimator.models
+
+    def swap(self):
+        """
+        Installs the models of the last finished training, if any
+
+        Returns True if the weights changed
+        """
+        with self.lock:
+            models, self.trained = self.trained, None
+
+        if models is None:
+            return False
+
+        self.estimator.models = models
+        return True
+
+    def wait(self):
+        """
+        Waits for the running training and installs its models
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.swap()
+
+
+class GreedyPolicy():
+    """
+    Variable selection heuristic that asks a trained Estimator at every
+    decision and uses the heuristic with the highest q value
+    """
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.action = -1
+
+    def __call__(self, var_range, cdata):
+        s = make_state(var_range, cdata)
+        q_values = self.estimator.predict([s])
+        self.action = int(np.argmax(q_values))
+        return heuristics.use_heuristic(self.action, var_range, cdata)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import glob
+import uuid
+import numpy as np
+
+# Columns of the store, one row per episode
+#   - instance: Path of the cnf file
+#   - restart: Training run (seed) the episode belongs to
+#   - episode: Episode number inside the training run
+#   - splits: Number of splits of the search
+#   - restarts: Number of restarts of the search
+#   - time: Wall time of the search in seconds
+#   - epsilon: Exploration rate of the agent during the episode
+COLUMNS = ['instance', 'restart', 'episode', 'splits', 'restarts', 'time',
+           'epsilon']
+
+CHUNK_PREFIX = 'chunk-'
+CHUNK_SUFFIX = '.npz'
+
+
+class RunStats(object):
+    """
+    Counters of the search, updated by dpll.solve, and the totals of every
+    finished episode
+    """
+    def __init__(self):
+        self.n_episodes = 0
+        self.n_splits = 0
+        self.n_restarts = 0
+        self.episode_stats = []
+        self.episode_restarts = []
+
+
+    def finish_episode(self):
+        self.episode_stats.append(self.n_splits)
+        self.episode_restarts.append(self.n_restarts)
+        self.n_splits = 0
+        self.n_restarts = 0
+        self.n_episodes += 1
+
+    def add_split(self):
+        self.n_splits += 1
+
+    def add_restart(self):
+        self.n_restarts += 1
+
+
+class RunStatsWriter(object):
+    """
+    Appends rows to a run statistics store: a directory of .npz chunks with
+    one array per column.
+
+    Rows are kept in memory and written as a new chunk every chunk_rows rows
+    and on close(). Every writer creates its own chunks with unique names, so
+    several processes can write to the same store without locks. Chunks are
+    written to a temporary file and renamed, readers never see half a chunk
+    """
+    def __init__(self, path, chunk_rows=10000):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = dict((c, []) for c in COLUMNS)
+        self.n_rows = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def append(self, instance, restart, episode, splits, restarts=0,
+               time=np.nan, epsilon=np.nan):
+        row = {'instance': instance, 'restart': restart, 'episode': episode,
+               'splits': splits, 'restarts': restarts, 'time': time,
+               'epsilon': epsilon}
+        for c in COLUMNS:
+            self.rows[c].append(row[c])
+
+        self.n_rows += 1
+        if self.n_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows as a new chunk
+        """
+        if not self.n_rows:
+            return
+
+        writeChunk(self.path, columnArrays(self.rows))
+
+        self.rows = dict((c, []) for c in COLUMNS)
+        self.n_rows = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+#
+#
+def columnArrays(rows):
+    """
+    Converts a dictionary column -> list of values into typed arrays
+    """
+    return {
+        'instance': np.array(rows['instance'], dtype=str),
+        'restart': np.array(rows['restart'], dtype=np.int32),
+        'episode': np.array(rows['episode'], dtype=np.int32),
+        'splits': np.array(rows['splits'], dtype=np.int64),
+        'restarts': np.array(rows['restarts'], dtype=np.int32),
+        'time': np.array(rows['time'], dtype=np.float64),
+        'epsilon': np.array(rows['epsilon'], dtype=np.float64),
+    }
+
+#
+#
+def writeChunk(path, arrays):
+    """
+    Writes the column arrays as a new chunk of the store in path and
+    returns its file name
+    """
+    name = os.path.join(path, CHUNK_PREFIX + uuid.uuid4().hex + CHUNK_SUFFIX)
+    tmp_name = name + '.tmp'
+
+    with open(tmp_name, 'wb') as f:
+        np.savez(f, **arrays)
+    os.rename(tmp_name, name)
+
+    return name
+
+#
+#
+def chunkFiles(path):
+    return sorted(glob.glob(os.path.join(path, CHUNK_PREFIX + '*' +
+                                         CHUNK_SUFFIX)))
+
+#
+#
+def loadRunStats(path, columns=None):
+    """
+    loadRunStats(path, columns) -> {column: array}
+
+    Loads the requested columns (all by default) of every chunk of the
+    store and concatenates them. Only the requested arrays are read from
+    the chunks
+    """
+    columns = COLUMNS if columns is None else columns
+    parts = dict((c, []) for c in columns)
+
+    for name in chunkFiles(path):
+        chunk = np.load(name, allow_pickle=False)
+        try:
+            for c in columns:
+                parts[c].append(chunk[c])
+        finally:
+            chunk.close()
+
+    stats = {}
+    for c in columns:
+        if parts[c]:
+            stats[c] = np.concatenate(parts[c])
+        else:
+            stats[c] = columnArrays(dict((k, []) for k in COLUMNS))[c]
+    return stats
+
+#
+#
+def compactRunStats(path):
+    """
+    Merges all the chunks of the store into a single one. The chunks
+    written while compacting are kept
+    """
+    names = chunkFiles(path)
+    if len(names) < 2:
+        return
+
+    parts = dict((c, []) for c in COLUMNS)
+    for name in names:
+        chunk = np.load(name, allow_pickle=False)
+        try:
+            for c in COLUMNS:
+                parts[c].append(chunk[c])
+        finally:
+            chunk.close()
+
+    writeChunk(path, dict((c, np.concatenate(parts[c])) for c in COLUMNS))
+
+    for name in names:
+        os.remove(name)
+
+#
+#
+def splitsByRestart(stats, instance=None):
+    """
+    Returns a (restarts x episodes) array with the number of splits of
+    every episode, as the old run_statsN.npy files stacked. Episodes that
+    were not recorded are NaN
+    """
+    select = np.ones(len(stats['splits']), dtype=bool)
+    if instance is not None:
+        select = stats['instance'] == instance
+
+    restart = stats['restart'][select]
+    episode = stats['episode'][select]
+    if not len(restart):
+        return np.zeros((0, 0))
+
+    matrix = np.full((restart.max() + 1, episode.max() + 1), np.nan)
+    matrix[restart, episode] = stats['splits'][select]
+    return matrix
+
+#
+#
+def importNpyRunStats(path, writer, instance=''):
+    """
+    Appends the splits of the old run_statsN.npy files in path to writer
+    """
+    for name in glob.glob(os.path.join(path, 'run_stats*.npy')):
+        restart = int(re.search(r'run_stats(\d+)\.npy$', name).group(1))
+        for episode, splits in enumerate(np.load(name, allow_pickle=True)):
+            writer.append(instance, restart, episode, splits)
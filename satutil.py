@@ -1,6 +1,19 @@
 # -*- coding: utf-8 -*-
 
 import random
+import collections
+import numpy as np
+
+# Formula packed into padded matrices of shape (num_clauses, max_clause_len)
+#   - clauses: list with the clauses in the order of the rows
+#   - variables: variable of each literal (0 in the padding)
+#   - positive: True where the literal is positive
+#   - valid: False in the padding
+PackedClauses = collections.namedtuple('PackedClauses',
+                                       'clauses variables positive valid')
+
+# Upper bound of the literal evaluations done at once by the batch functions
+BATCH_CHUNK_SIZE = 1 << 22
 
 #
 #
@@ -105,4 +118,148 @@ def removeTautologies(clauses):
             break
             
     for c in tautologies:
-        clauses.remove(c)
\ No newline at end of file
+        clauses.remove(c)
+
+
+#
+#
+def packClauses(clauses):
+    """
+    packClauses(clauses: [clause]): PackedClauses
+
+    Packs the formula once so that many interpretations can be checked
+    with the batch* functions
+    """
+    clauses = list(clauses)
+    max_len = max([len(c) for c in clauses] or [0])
+
+    lits = np.zeros((len(clauses), max_len), dtype=np.int64)
+    for i, clause in enumerate(clauses):
+        lits[i, :len(clause)] = list(clause)
+
+    return PackedClauses(clauses, np.abs(lits), lits > 0, lits != 0)
+
+#
+#
+def interpretationsToArray(interpretations):
+    """
+    interpretationsToArray(interpretations: [[boolean]]): np.array
+
+    Converts a list of interpretations in the [None, truth_value1, ...]
+    format into a boolean matrix of shape (batch, num_vars + 1). Unassigned
+    variables are considered false
+    """
+    if isinstance(interpretations, np.ndarray):
+        return interpretations.astype(bool, copy=False)
+
+    return np.array([[bool(v) for v in intp] for intp in interpretations],
+                    dtype=bool)
+
+#
+#
+def batchSatisfiedClauses(packed, interpretations):
+    """
+    batchSatisfiedClauses(packed: PackedClauses,
+                          interpretations: [[boolean]]): np.array
+
+    Returns a boolean matrix of shape (batch, num_clauses) with the
+    satisfied clauses of every interpretation
+    """
+    intps = interpretationsToArray(interpretations)
+    nclauses, max_len = packed.variables.shape
+    satisfied = np.empty((len(intps), nclauses), dtype=bool)
+
+    step = max(1, BATCH_CHUNK_SIZE // max(1, nclauses * max_len))
+    for start in xrange(0, len(intps), step):
+        values = intps[start:start+step][:, packed.variables]
+        satisfied[start:start+step] = \
+            ((values == packed.positive) & packed.valid).any(axis=2)
+
+    return satisfied
+
+#
+#
+def batchSatisfies(packed, interpretations):
+    """
+    batchSatisfies(packed: PackedClauses,
+                   interpretations: [[boolean]]): np.array
+
+    Batch version of satisfies. Returns a boolean vector
+    """
+    return batchSatisfiedClauses(packed, interpretations).all(axis=1)
+
+#
+#
+def batchSatisfiesEach(packs, interpretations):
+    """
+    batchSatisfiesEach(packs: [PackedClauses],
+                       interpretations: [[boolean]]): np.array
+
+    Checks every interpretation against its own formula. The formulas are
+    stacked as one formula over disjoint ranges of variables, so all of
+    them are checked in one pass. Returns a boolean vector
+    """
+    if not packs:
+        return np.zeros(0, dtype=bool)
+
+    intps = [np.asarray(intp, dtype=bool) for intp in interpretations]
+    max_len = max(p.variables.shape[1] for p in packs)
+
+    def pad(matrix):
+        return np.pad(matrix, ((0, 0), (0, max_len - matrix.shape[1])),
+                      'constant')
+
+    # Variables of the formula i start after the interpretations before it
+    shifts = np.cumsum([0] + [len(intp) for intp in intps[:-1]])
+
+    stacked = PackedClauses(
+        None,
+        np.concatenate([pad(p.variables) + shift
+                        for p, shift in zip(packs, shifts)]),
+        np.concatenate([pad(p.positive) for p in packs]),
+        np.concatenate([pad(p.valid) for p in packs]))
+
+    satisfied = batchSatisfiedClauses(stacked,
+                                      np.concatenate(intps)[None])[0]
+
+    # Formula of every row
+    owner = np.repeat(np.arange(len(packs)), [len(p.clauses) for p in packs])
+    return np.bincount(owner[~satisfied], minlength=len(packs)) == 0
+
+#
+#
+def batchNumSatisfiedClauses(packed, interpretations):
+    """
+    batchNumSatisfiedClauses(packed: PackedClauses,
+                             interpretations: [[boolean]]): np.array
+
+    Batch version of numSatisfiedClauses. Returns an integer vector
+    """
+    return batchSatisfiedClauses(packed, interpretations).sum(axis=1)
+
+#
+#
+def packWeights(packed, weights):
+    """
+    packWeights(packed: PackedClauses, weights: {clause:int}): np.array
+
+    Returns the weights in the order of the packed clauses
+    """
+    return np.array([weights[c] for c in packed.clauses])
+
+#
+#
+def batchNumSatisfiedWeightedClauses(packed, interpretations, weights):
+    """
+    batchNumSatisfiedWeightedClauses(packed: PackedClauses,
+                                     interpretations: [[boolean]],
+                                     weights: {clause:int} | np.array)
+                                                                : np.array
+
+    Batch version of numSatisfiedWeightedClauses. weights can also be the
+    vector returned by packWeights
+    """
+    if not isinstance(weights, np.ndarray):
+        weights = packWeights(packed, weights)
+
+    return batchSatisfiedClauses(packed, interpretations).dot(weights)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import signal
+import socket
+import pickle
+import argparse
+import cStringIO
+import threading
+import SocketServer
+import multiprocessing
+import dpll
+import datautil
+import certificates
+from fanSATstic import RunStats, var_selection_heuristics, MOST_OFTEN
+from fanSATstic import UNSATISFIABLE_OUT, UNKNOWN_OUT
+from rl_agent import GreedyPolicy
+
+
+__description__ = 'Long lived FanSATstic solver. Reads dimacs problems ' \
+                  'from a unix socket or stdin and streams the results back'
+
+# A line with only this marks the end of a problem and of a result
+END_OF_REQUEST = '.'
+
+# Per worker state, set once by initWorker
+worker_heuristic = None
+worker_caches = None
+worker_cache_size = None
+
+
+#
+#
+def initWorker(vselection, policy, n_formulas, cache_size):
+    """
+    Loads the heuristic (or the saved agent) once per worker process and
+    creates the unsat caches, kept for the n_formulas most recently solved
+    formulas
+    """
+    global worker_heuristic, worker_caches, worker_cache_size
+
+    if policy is not None:
+        with open(policy, 'rb') as f:
+            worker_heuristic = GreedyPolicy(pickle.load(f))
+    else:
+        worker_heuristic = var_selection_heuristics[vselection]
+
+    worker_caches = datautil.LRUCache(n_formulas)
+    worker_cache_size = cache_size
+
+
+#
+#
+def solveRequest(request_id, text):
+    """
+    Solves a dimacs problem in a worker and returns the result lines.
+    Sending the same formula again reuses its unsat cache (see
+    dpll.solve)
+    """
+    start = time.time()
+    lines = ['c request %d' % request_id]
+
+    try:
+        num_vars, clauses = datautil.parseCNFLines(text.splitlines())
+
+        # Formulas are identified by their content
+        key = datautil.FormulaHash(clauses).value
+        unsat_cache = worker_caches.get(key)
+        if unsat_cache is None:
+            unsat_cache = datautil.LRUCache(worker_cache_size)
+            worker_caches.put(key, unsat_cache)
+
+        run_stats = RunStats()
+        sat, model = dpll.solve(num_vars, clauses, worker_heuristic,
+                                run_stats, unsat_cache=unsat_cache)
+
+        if sat:
+            # Same certificate as fanSATstic.py, without the last newline
+            # that joining the lines adds
+            out = cStringIO.StringIO()
+            certificates.writeModel(out, model[1:])
+            lines.append(out.getvalue().rstrip('\n'))
+        else:
+            lines.append(UNSATISFIABLE_OUT)
+        lines.append('c splits %d' % run_stats.n_splits)
+
+    except Exception, e:
+        lines.append('c error %s: %s' % (type(e).__name__, e))
+        lines.append(UNKNOWN_OUT)
+
+    lines.append('c time %.6f' % (time.time() - start))
+    return '\n'.join(lines)
+
+
+#
+#
+def readRequests(rfile):
+    """
+    Yields the problems of a stream, every one ends with a line with only
+    END_OF_REQUEST. A problem without it at the end of the stream is
+    returned too
+    """
+    lines = []
+
+    for line in iter(rfile.readline, ''):
+        if line.strip() == END_OF_REQUEST:
+            yield ''.join(lines)
+            lines = []
+        else:
+            lines.append(line)
+
+    if ''.join(lines).strip():
+        yield ''.join(lines)
+
+
+#
+#
+def serveStream(rfile, wfile, pool):
+    """
+    Sends every problem of rfile to the worker pool as soon as it is read
+    and writes each result to wfile when it is ready, so the results may
+    come back out of order (see the request line of the result)
+    """
+    lock = threading.Lock()
+
+    def send(result):
+        # Called from the pool thread, a client that went away must not
+        # break it
+        try:
+            with lock:
+                wfile.write('%s\n%s\n' % (result, END_OF_REQUEST))
+                wfile.flush()
+        except (IOError, socket.error):
+            pass
+
+    pending = []
+    for request_id, text in enumerate(readRequests(rfile)):
+        pending.append(pool.apply_async(solveRequest, (request_id, text),
+                                        callback=send))
+
+    for result in pending:
+        result.wait()
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Serves every connection of the unix socket in its own thread
+    """
+    def handle(self):
+        serveStream(self.rfile, self.wfile, self.server.pool)
+
+
+class SolverServer(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        SocketServer.ThreadingUnixStreamServer.__init__(self, path,
+                                                         RequestHandler)
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('-s', '--socket', action='store', default=None,
+                        help='Path of the unix socket to listen on. If it is '
+                        'not given the problems are read from stdin')
+
+    parser.add_argument('-j', '--jobs', action='store', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of worker processes. '
+                        'DEFAULT = number of cpus')
+
+    parser.add_argument('-vsh', '--vselection', action='store',
+                        default=MOST_OFTEN,
+                        choices=var_selection_heuristics.keys(),
+                        help='Specifies the variable selection heuristic. '
+                        'DEFAULT = %s' % MOST_OFTEN)
+
+    parser.add_argument('-p', '--policy', action='store', default=None,
+                        help='Agent saved with fanSATstic.py --save-policy. '
+                        'Its greedy choice of heuristic is used instead of '
+                        '--vselection')
+
+    parser.add_argument('-cf', '--cached-formulas', action='store', type=int,
+                        default=32,
+                        help='Number of formulas per worker whose unsat '
+                        'cache is kept between requests. DEFAULT = 32')
+
+    parser.add_argument('-uc', '--unsat-cache', action='store', type=int,
+                        default=100000,
+                        help='Maximum size of the unsat cache of every '
+                        'formula. DEFAULT = 100000')
+
+    options = parser.parse_args()
+
+    pool = multiprocessing.Pool(options.jobs, initWorker,
+                                (options.vselection, options.policy,
+                                 options.cached_formulas,
+                                 options.unsat_cache))
+
+    # Clean up the socket and the workers when killed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        if options.socket is None:
+            serveStream(sys.stdin, sys.stdout, pool)
+        else:
+            if os.path.exists(options.socket):
+                os.remove(options.socket)
+
+            server = SolverServer(options.socket, pool)
+            try:
+                server.serve_forever()
+            finally:
+                server.server_close()
+                os.remove(options.socket)
+    finally:
+        pool.terminate()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import os
+import uuid
+import tempfile
+import itertools
+import numpy as np
+
+# First value of every published formula
+MAGIC = 0x464e5343
+
+# Header: magic, number of variables, number of clauses, number of literals
+HEADER_LEN = 4
+
+#
+#
+def sharedDirectory():
+    """
+    Directory where the formulas are published: /dev/shm (memory) when it
+    exists, the temporary directory otherwise
+    """
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+#
+#
+def publishFormula(num_vars, clauses, path=None):
+    """
+    publishFormula(num_vars, clauses, path) -> path
+
+    Writes the formula once as flat arrays in a file that every process can
+    map read-only with SharedFormula, instead of parsing the cnf file or
+    pickling the clauses in each of them:
+
+        - offsets: int64[n_clauses + 1], the literals of the clause i are
+                   literals[offsets[i]:offsets[i+1]]
+        - literals: int32[n_literals]
+
+    The file is created in sharedDirectory() if path is not given. It must
+    be removed with unpublishFormula
+    """
+    if path is None:
+        path = os.path.join(sharedDirectory(),
+                            'fansatstic-%s.formula' % uuid.uuid4().hex)
+
+    clauses = list(clauses)
+    lengths = np.array([len(c) for c in clauses], dtype=np.int64)
+
+    offsets = np.zeros(len(clauses) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    literals = np.fromiter(itertools.chain.from_iterable(clauses),
+                           dtype=np.int32, count=int(offsets[-1]))
+
+    header = np.array([MAGIC, num_vars, len(clauses), len(literals)],
+                      dtype=np.int64)
+
+    # Readers never see a half written formula
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for array in (header, offsets, literals):
+            array.tofile(f)
+    os.rename(tmp_path, path)
+
+    return path
+
+#
+#
+def unpublishFormula(path):
+    """
+    Removes a published formula. The processes that have it mapped can
+    keep using it
+    """
+    os.remove(path)
+
+
+class SharedFormula(object):
+    """
+    Read-only view of a formula published with publishFormula. The arrays
+    are mapped from the file, so every process that attaches to the same
+    formula shares its pages instead of parsing or unpickling the formula.
+
+    dpll.solve modifies the clauses it is given, so the search can not run
+    over the mapping. Every process builds the clause frozensets once (see
+    clauseSet) and every search keeps its own set and literal index
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        header = self.data[:8*HEADER_LEN].view(np.int64)
+        if header[0] != MAGIC:
+            raise ValueError('"%s" is not a published formula' % path)
+
+        self.num_vars, self.n_clauses, self.n_literals = map(int, header[1:])
+
+        start = 8*HEADER_LEN
+        self.offsets, start = self._array(start, np.int64, self.n_clauses + 1)
+        self.literals, start = self._array(start, np.int32, self.n_literals)
+
+        # Clauses of clauseSet, built on the first call
+        self.frozen = None
+
+    def _array(self, start, dtype, count):
+        end = start + np.dtype(dtype).itemsize * count
+        return self.data[start:end].view(dtype), end
+
+    def __len__(self):
+        return self.n_clauses
+
+    def clauseSet(self):
+        """
+        Returns the clauses as the set of frozensets used by dpll.solve. The
+        search modifies the set, so every search needs its own one, but the
+        frozensets are immutable: they are built once per process and every
+        set returned holds the same ones
+        """
+        if self.frozen is None:
+            literals = self.literals.tolist()
+            offsets = self.offsets.tolist()
+            self.frozen = [frozenset(literals[offsets[i]:offsets[i+1]])
+                           for i in xrange(self.n_clauses)]
+
+        return set(self.frozen)
+
+    def close(self):
+        """
+        Drops the arrays, the file is unmapped once no view of it is left
+        """
+        self.data = self.offsets = self.literals = self.frozen = None
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import traceback
+import multiprocessing
+import datautil
+import symmetry
+import fanSATstic
+import sharedformula
+
+
+__description__ = 'Trains agents over a grid or a random sample of ' \
+                  'hyperparameters in parallel and collects the results ' \
+                  'in one table'
+
+# Options of fanSATstic.py that a sweep can not change
+FIXED_OPTIONS = ['file', 'algorithm', 'count', 'training_runs', 'stats_dir',
+                 'save_policy']
+
+# Episodes of the end of a training run used to measure the trained agent
+FINAL_FRACTION = 0.1
+
+# Formula of the sweep, attached once per worker by initWorker
+worker_formula = None
+
+
+#
+#
+def sampleValue(dist, rng):
+    """
+    Draws a value of a random search distribution:
+
+        - {"uniform": [low, high]}
+        - {"loguniform": [low, high]}
+        - {"randint": [low, high]}: Integer in [low, high]
+        - {"choice": [v1, v2, ...]}
+    """
+    if len(dist) != 1:
+        raise ValueError('Invalid distribution %r' % (dist,))
+
+    kind, args = dist.items()[0]
+
+    if kind == 'uniform':
+        return rng.uniform(*args)
+    if kind == 'loguniform':
+        return math.exp(rng.uniform(math.log(args[0]), math.log(args[1])))
+    if kind == 'randint':
+        return rng.randint(*args)
+    if kind == 'choice':
+        return rng.choice(args)
+
+    raise ValueError('Unknown distribution "%s"' % kind)
+
+#
+#
+def configurations(spec):
+    """
+    Returns the list of hyperparameter dictionaries of a sweep spec:
+
+        - grid: {option: [values]}, every combination is used
+        - random: {option: distribution} (see sampleValue)
+        - samples: Number of random draws for every grid point. DEFAULT = 1
+        - sample_seed: Seed of the random draws. DEFAULT = 0
+
+    The draws only depend on the spec, so a resumed sweep gets the same
+    configurations and finds them in the cache
+    """
+    grid = spec.get('grid', {})
+    names = sorted(grid)
+    points = [dict(zip(names, values))
+              for values in itertools.product(*[grid[n] for n in names])]
+
+    dists = spec.get('random', {})
+    if not dists:
+        return points
+
+    rng = random.Random(spec.get('sample_seed', 0))
+    configs = []
+
+    for point in points:
+        for _ in xrange(spec.get('samples', 1)):
+            config = dict(point)
+            for name in sorted(dists):
+                config[name] = sampleValue(dists[name], rng)
+            configs.append(config)
+
+    return configs
+
+#
+#
+def seedList(spec):
+    """
+    seeds can be a list of seeds or the number of seeds, starting at 0
+    """
+    seeds = spec.get('seeds', 1)
+    if isinstance(seeds, int):
+        return range(seeds)
+    return list(seeds)
+
+#
+#
+def fileDigest(fname):
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+#
+#
+def makeCells(spec, fname):
+    """
+    Returns the (key, options, config, seed) of every cell of the sweep.
+    options are the fanSATstic.py options of the training run: its
+    defaults, then the fixed values of the spec and the configuration.
+
+    The key identifies the cell by the content of the cnf file and every
+    option that affects the training
+    """
+    defaults = vars(fanSATstic.buildParser().parse_args(['-f', fname]))
+    digest = fileDigest(fname)
+
+    fixed = spec.get('fixed', {})
+    configs = configurations(spec)
+
+    for name in itertools.chain(fixed, *configs):
+        if name not in defaults or name in FIXED_OPTIONS:
+            raise ValueError('"%s" is not an option that a sweep can change'
+                             % name)
+
+    cells = []
+    for config, seed in itertools.product(configs, seedList(spec)):
+        values = dict(defaults)
+        values.update(fixed)
+        values.update(config)
+
+        relevant = dict((k, v) for k, v in values.items()
+                        if k not in FIXED_OPTIONS)
+        key = hashlib.sha1(json.dumps([digest, seed, relevant],
+                                      sort_keys=True)).hexdigest()
+
+        cells.append((key, argparse.Namespace(**values), config, seed))
+
+    return cells
+
+#
+#
+def cellPath(cache_dir, key):
+    return os.path.join(cache_dir, key + '.json')
+
+#
+#
+def loadCell(cache_dir, key):
+    """
+    Returns the result of a finished cell or None
+    """
+    try:
+        with open(cellPath(cache_dir, key)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+#
+#
+def saveCell(cache_dir, result):
+    """
+    Writes the result of a cell. It is renamed into place, so a sweep that
+    is killed never leaves half a result behind
+    """
+    path = cellPath(cache_dir, result['key'])
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, sort_keys=True)
+    os.rename(tmp_path, path)
+
+#
+#
+def initWorker(formula_path):
+    """
+    Attaches the worker to the formula published by runSweep
+    """
+    global worker_formula
+
+    # The episode lines of every worker would be mixed up
+    sys.stdout = open(os.devnull, 'w')
+
+    worker_formula = sharedformula.SharedFormula(formula_path)
+
+#
+#
+def runCell(cell):
+    """
+    Trains one agent in a worker and stores its result in the cache.
+    Returns the result, or the key and the error if the training failed
+    """
+    key, options, config, seed, cache_dir = cell
+    start = time.time()
+
+    try:
+        # Every episode copies this set, the clauses come from the
+        # published formula instead of parsing the cnf file each time
+        num_vars = worker_formula.num_vars
+        clauses = worker_formula.clauseSet()
+        if options.symmetry:
+            num_vars, _ = symmetry.addSymmetryBreaking(num_vars, clauses)
+
+        run_stats = fanSATstic.trainAgent(options, seed,
+                                          formula=(num_vars, clauses))
+    except Exception:
+        return {'key': key, 'error': traceback.format_exc()}
+
+    result = {'key': key, 'config': config, 'seed': seed,
+              'splits': run_stats.episode_stats,
+              'restarts': run_stats.episode_restarts,
+              'time': time.time() - start}
+    saveCell(cache_dir, result)
+    return result
+
+#
+#
+def runSweep(cells, cache_dir, jobs, log=sys.stderr):
+    """
+    Trains the cells that are not in the cache with a pool of jobs
+    processes. Returns the results of every cell, in the order of cells,
+    and the number of failed cells
+
+    The cnf file of the cells is parsed once and published with
+    sharedformula, the workers map it instead of parsing it again
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    results = {}
+    todo = []
+    for key, options, config, seed in cells:
+        result = loadCell(cache_dir, key)
+        if result is not None:
+            results[key] = result
+        else:
+            todo.append((key, options, config, seed, cache_dir))
+
+    log.write('c %d cells, %d cached\n' % (len(cells), len(results)))
+
+    failed = 0
+    if todo:
+        formula_path = sharedformula.publishFormula(
+            *datautil.parseCNF(todo[0][1].file))
+
+        pool = multiprocessing.Pool(jobs, initWorker, (formula_path,))
+        try:
+            for done, result in enumerate(pool.imap_unordered(runCell, todo)):
+                if 'error' in result:
+                    failed += 1
+                    log.write('c cell %s failed\n%s' % (result['key'],
+                                                        result['error']))
+                else:
+                    results[result['key']] = result
+                log.write('c %d/%d cells trained\n' % (done + 1, len(todo)))
+        finally:
+            pool.terminate()
+            sharedformula.unpublishFormula(formula_path)
+
+    return [results[key] for key, _, _, _ in cells if key in results], failed
+
+#
+#
+def writeTable(results, out):
+    """
+    Writes one csv row per cell: its hyperparameters, seed and the splits
+    of the episodes (mean, mean of the last FINAL_FRACTION of them and
+    minimum)
+    """
+    names = sorted(set(name for r in results for name in r['config']))
+
+    writer = csv.writer(out)
+    writer.writerow(names + ['seed', 'episodes', 'mean_splits',
+                             'final_splits', 'min_splits', 'time', 'key'])
+
+    for r in results:
+        splits = r['splits']
+        final = splits[-max(1, int(len(splits) * FINAL_FRACTION)):]
+
+        writer.writerow([r['config'].get(name, '') for name in names] +
+                        [r['seed'], len(splits),
+                         '%.2f' % (float(sum(splits)) / max(len(splits), 1)),
+                         '%.2f' % (float(sum(final)) / max(len(final), 1)),
+                         min(splits) if splits else '',
+                         '%.3f' % r['time'], r['key']])
+
+
+
+
+#######################
+#                     #
+# Program entry point #
+#                     #
+#######################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__description__)
+
+    parser.add_argument('spec',
+                        help='json file with the sweep: "grid" and/or '
+                        '"random" hyperparameters (fanSATstic.py option '
+                        'names, f.e. epsilon_decay), "samples", '
+                        '"sample_seed", "seeds" and "fixed" option values')
+
+    parser.add_argument('-f', '--file', action='store', default=None,
+                        help='Path to a cnf file. DEFAULT = "file" of the '
+                        'spec')
+
+    parser.add_argument('-j', '--jobs', action='store', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of agents trained at the same time. '
+                        'DEFAULT = number of cpus')
+
+    parser.add_argument('-cd', '--cache-dir', action='store',
+                        default='sweep_cache',
+                        help='Directory with the results of the finished '
+                        'cells, an interrupted sweep resumes from it. '
+                        'DEFAULT = sweep_cache')
+
+    parser.add_argument('-o', '--output', action='store', default='sweep.csv',
+                        help='csv file with the table of results. '
+                        'DEFAULT = sweep.csv')
+
+    options = parser.parse_args()
+
+    with open(options.spec) as f:
+        spec = json.load(f)
+
+    fname = options.file or spec.get('file')
+    if not fname:
+        parser.error('no cnf file given')
+
+    try:
+        cells = makeCells(spec, fname)
+    except ValueError, e:
+        parser.error(str(e))
+
+    results, failed = runSweep(cells, options.cache_dir, options.jobs)
+
+    with open(options.output, 'wb') as f:
+        writeTable(results, f)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+#
+#
+def clauseLiteralGraph(clauses):
+    """
+    clauseLiteralGraph(clauses) -> (literals, adjacency, colours)
+
+    Builds the graph used to look for symmetries: one vertex per literal of
+    the variables that appear in the formula and one per clause. Every
+    literal is connected to its negation and to the clauses it belongs to.
+
+        - literals: literal of every literal vertex (they go first)
+        - adjacency: list with the neighbours of every vertex
+        - colours: initial colour of every vertex. All the literals share a
+                   colour, so phase shifts (x -> -y) are found too, and
+                   clauses are coloured by length
+    """
+    variables = sorted(set(abs(l) for c in clauses for l in c))
+
+    literals = []
+    for v in variables:
+        literals.extend((v, -v))
+    index = dict((l, i) for i, l in enumerate(literals))
+
+    adjacency = [[] for _ in literals]
+    for v in variables:
+        adjacency[index[v]].append(index[-v])
+        adjacency[index[-v]].append(index[v])
+
+    colours = [0] * len(literals)
+
+    for clause in clauses:
+        ci = len(adjacency)
+        adjacency.append([])
+        colours.append(1 + len(clause))
+
+        for l in clause:
+            adjacency[ci].append(index[l])
+            adjacency[index[l]].append(ci)
+
+    return literals, adjacency, colours
+
+#
+#
+def refine(colours, adjacency):
+    """
+    Colour refinement: splits the vertices of every colour by the colours
+    of their neighbours until the partition is stable.
+
+    Colours are renumbered by sorting the signatures, so refining two
+    partitions that only differ by an automorphism gives the same colours
+    """
+    ncolours = len(set(colours))
+
+    while True:
+        signatures = [(colours[v], tuple(sorted(colours[u]
+                                                for u in adjacency[v])))
+                      for v in xrange(len(colours))]
+
+        ordered = sorted(set(signatures))
+        if len(ordered) == ncolours:
+            return colours
+
+        number = dict((s, i) for i, s in enumerate(ordered))
+        colours = [number[s] for s in signatures]
+        ncolours = len(ordered)
+
+#
+#
+def individualize(colours, v):
+    """
+    Returns a copy of colours where v has its own colour
+    """
+    colours = list(colours)
+    colours[v] = max(colours) + 1
+    return colours
+
+#
+#
+def cells(colours):
+    """
+    Returns a dictionary colour -> list of vertices
+    """
+    partition = {}
+    for v, c in enumerate(colours):
+        partition.setdefault(c, []).append(v)
+    return partition
+
+#
+#
+def searchAutomorphism(colours_a, colours_b, adjacency, budget):
+    """
+    Looks for an automorphism that maps the partition colours_a onto
+    colours_b by individualizing and refining both of them at the same
+    time. budget is a one element list with the number of search nodes
+    left
+
+    Returns the automorphism as a list vertex -> vertex, or None
+    """
+    if budget[0] <= 0:
+        return None
+    budget[0] -= 1
+
+    colours_a = refine(colours_a, adjacency)
+    colours_b = refine(colours_b, adjacency)
+
+    cells_a = cells(colours_a)
+    cells_b = cells(colours_b)
+
+    if sorted((c, len(vs)) for c, vs in cells_a.iteritems()) != \
+            sorted((c, len(vs)) for c, vs in cells_b.iteritems()):
+        return None
+
+    # Discrete partition, the mapping is fixed
+    if len(cells_a) == len(colours_a):
+        perm = [None] * len(colours_a)
+        for c, (v,) in cells_a.iteritems():
+            perm[v] = cells_b[c][0]
+
+        for v, neighbours in enumerate(adjacency):
+            images = set(perm[u] for u in neighbours)
+            if images != set(adjacency[perm[v]]):
+                return None
+        return perm
+
+    # Smallest non singleton cell
+    colour = min((len(vs), c) for c, vs in cells_a.iteritems()
+                 if len(vs) > 1)[1]
+    v = cells_a[colour][0]
+
+    for w in cells_b[colour]:
+        perm = searchAutomorphism(individualize(colours_a, v),
+                                  individualize(colours_b, w),
+                                  adjacency, budget)
+        if perm is not None:
+            return perm
+
+    return None
+
+#
+#
+def findSymmetries(clauses, max_generators=50, budget=10000):
+    """
+    findSymmetries(clauses, max_generators, budget) -> [{literal: literal}]
+
+    Returns generators of literal permutations that map the formula onto
+    itself. They are searched along a chain of stabilizers: for the first
+    non singleton cell of the refined partition, an automorphism mapping
+    its first vertex to every other vertex of the cell is looked for,
+    then the first vertex is fixed and the next cell is processed.
+
+    Vertices already in the same orbit are skipped. budget bounds the
+    total number of search nodes
+    """
+    clauses = list(clauses)
+    literals, adjacency, colours = clauseLiteralGraph(clauses)
+    nliterals = len(literals)
+
+    # Union find over the literal vertices to track orbits
+    orbit = range(nliterals)
+
+    def find(v):
+        while orbit[v] != v:
+            orbit[v] = orbit[orbit[v]]
+            v = orbit[v]
+        return v
+
+    generators = []
+    left = [budget]
+    colours = refine(colours, adjacency)
+
+    while len(generators) < max_generators and left[0] > 0:
+        partition = cells(colours)
+        literal_cells = [vs for vs in partition.itervalues()
+                         if len(vs) > 1 and vs[0] < nliterals]
+        if not literal_cells:
+            break
+
+        cell = min(literal_cells, key=len)
+        v = cell[0]
+
+        for w in cell[1:]:
+            if find(w) == find(v) or len(generators) >= max_generators:
+                continue
+
+            perm = searchAutomorphism(individualize(colours, v),
+                                      individualize(colours, w),
+                                      adjacency, left)
+            if perm is None:
+                continue
+
+            generators.append(dict((literals[u], literals[perm[u]])
+                                   for u in xrange(nliterals)
+                                   if perm[u] != u))
+            for u in xrange(nliterals):
+                orbit[find(u)] = find(perm[u])
+
+        colours = refine(individualize(colours, v), adjacency)
+
+    return [g for g in generators if isSymmetry(g, clauses)]
+
+#
+#
+def isSymmetry(perm, clauses):
+    """
+    Returns True if the literal permutation maps the clauses onto
+    themselves
+    """
+    clauses = set(clauses)
+    for clause in clauses:
+        if frozenset(perm.get(l, l) for l in clause) not in clauses:
+            return False
+    return True
+
+#
+#
+def lexLeaderClauses(perm, next_var, max_chain=30):
+    """
+    lexLeaderClauses(perm, next_var, max_chain) -> (clauses, next_var)
+
+    Clauses that only accept assignments that are lexicographically
+    smaller or equal than their image by perm, comparing the variables in
+    increasing order (False < True). Every orbit keeps its smallest
+    assignment, so satisfiability is preserved.
+
+    Auxiliary variables p_i (starting at next_var) mean that the first i
+    variables are equal to their images:
+
+        p_0 = True
+        p_i-1 -> (x_i -> y_i)
+        p_i-1 and x_i -> p_i
+        p_i-1 and not y_i -> p_i
+
+    where y_i = perm(x_i). Only the first max_chain variables moved by perm
+    are used
+    """
+    support = sorted(set(abs(l) for l in perm if perm[l] != l))[:max_chain]
+
+    clauses = []
+    previous = None
+
+    for i, x in enumerate(support):
+        y = perm.get(x, x)
+        prefix = [-previous] if previous is not None else []
+
+        # x <= -x only holds with x = False, the prefix can not go on
+        if y == -x:
+            clauses.append(frozenset(prefix + [-x]))
+            break
+
+        clauses.append(frozenset(prefix + [-x, y]))
+
+        if i == len(support) - 1:
+            break
+
+        p = next_var
+        next_var += 1
+        clauses.append(frozenset(prefix + [-x, p]))
+        clauses.append(frozenset(prefix + [y, p]))
+        previous = p
+
+    return clauses, next_var
+
+#
+#
+def addSymmetryBreaking(num_vars, clauses, max_generators=50, budget=10000):
+    """
+    addSymmetryBreaking(num_vars, clauses) -> (num_vars, generators)
+
+    Adds to clauses (a set of frozensets) the lex-leader clauses of the
+    symmetries found by findSymmetries. Returns the new number of
+    variables, including the auxiliary ones, and the generators
+    """
+    generators = findSymmetries(clauses, max_generators, budget)
+
+    next_var = num_vars + 1
+    for perm in generators:
+        sb_clauses, next_var = lexLeaderClauses(perm, next_var)
+        clauses.update(sb_clauses)
+
+    return next_var - 1, generators
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import json
+import timeit
+
+
+class SearchTracer(object):
+    """
+    Records the nodes of a dpll search (see the tracer option of
+    dpll.solve).
+
+    Every sample_every-th node is kept in a ring buffer of capacity
+    records, so the memory of a long search is bounded and the oldest
+    nodes are dropped first. A record holds:
+
+        - start, end: Timestamps in seconds
+        - depth: Number of decisions of the node
+        - lit: Branching literal, 0 if the node did not branch
+        - heuristic: Action of the heuristic that chose lit (the action
+                     attribute of the heuristic, see automatic_heuristic),
+                     -1 if it has none
+        - propagations: Variables set by unit propagation and pure literals
+        - conflicts: Empty clauses reached at the node, including the
+                     branches that fail as soon as they are set
+        - sat: True if a model was found below the node
+
+    The per depth totals of depthHistogram count every node, not only the
+    sampled ones
+    """
+    def __init__(self, capacity=100000, sample_every=1):
+        self.capacity = capacity
+        self.sample_every = sample_every
+        self.records = []
+        self.next = 0
+        self.n_nodes = 0
+        self.origin = timeit.default_timer()
+
+        # Nodes being solved: [start, depth, lit, heuristic, propagations,
+        # conflicts, sampled]
+        self.stack = []
+
+        # depth -> [nodes, conflicts, propagations, seconds]
+        self.depths = {}
+
+    def enter(self, depth):
+        self.stack.append([timeit.default_timer(), depth, 0, -1, 0, 0,
+                           self.n_nodes % self.sample_every == 0])
+        self.n_nodes += 1
+
+    def propagated(self, n_vars):
+        self.stack[-1][4] = n_vars
+
+    def decision(self, lit, heuristic, n_vars):
+        node = self.stack[-1]
+        node[2] = lit
+        node[3] = heuristic
+        node[4] = n_vars
+
+    def conflict(self):
+        if self.stack:
+            self.stack[-1][5] += 1
+
+    def exit(self, sat):
+        end = timeit.default_timer()
+        start, depth, lit, heuristic, propagations, conflicts, sampled = \
+            self.stack.pop()
+
+        totals = self.depths.get(depth)
+        if totals is None:
+            totals = self.depths[depth] = [0, 0, 0, 0.0]
+        totals[0] += 1
+        totals[1] += conflicts
+        totals[2] += propagations
+        totals[3] += end - start
+
+        if not sampled:
+            return
+
+        record = (start, end, depth, lit, heuristic, propagations, conflicts,
+                  sat)
+        if len(self.records) < self.capacity:
+            self.records.append(record)
+        else:
+            self.records[self.next] = record
+            self.next = (self.next + 1) % self.capacity
+
+    def nSampled(self):
+        return (self.n_nodes + self.sample_every - 1) // self.sample_every
+
+    def sampledRecords(self):
+        """
+        Returns the records in the buffer, oldest first
+        """
+        return self.records[self.next:] + self.records[:self.next]
+
+    def chromeTrace(self):
+        """
+        Returns the records as a Chrome trace event dictionary, one complete
+        event per node. Nested nodes are nested events
+        """
+        events = []
+        for start, end, depth, lit, heuristic, propagations, conflicts, \
+                sat in self.sampledRecords():
+            events.append({
+                'name': 'branch %d' % lit if lit else 'leaf',
+                'cat': 'dpll',
+                'ph': 'X',
+                'ts': (start - self.origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': 0,
+                'tid': 0,
+                'args': {'depth': depth, 'lit': lit, 'heuristic': heuristic,
+                         'propagations': propagations,
+                         'conflicts': conflicts, 'sat': sat},
+            })
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'nodes': self.n_nodes,
+                              'sample_every': self.sample_every,
+                              'dropped': max(0, self.nSampled() -
+                                             self.capacity)}}
+
+    def writeChromeTrace(self, path):
+        """
+        Writes the trace, it can be opened with chrome://tracing or Perfetto
+        """
+        with open(path, 'w') as f:
+            json.dump(self.chromeTrace(), f)
+
+    def depthHistogram(self):
+        """
+        Returns a list of (depth, nodes, conflicts, propagations, seconds),
+        sorted by depth. seconds include the time of the nodes below
+        """
+        return [tuple([depth] + self.depths[depth])
+                for depth in sorted(self.depths)]
+
+    def writeDepthHistogram(self, out):
+        """
+        Writes the histogram as tab separated columns
+        """
+        out.write('depth\tnodes\tconflicts\tpropagations\tseconds\n')
+        for depth, nodes, conflicts, propagations, seconds in \
+                self.depthHistogram():
+            out.write('%d\t%d\t%d\t%d\t%.6f\n' % (depth, nodes, conflicts,
+                                                  propagations, seconds))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import collections
+
+#
+#
+def detectXors(clauses, max_size=6):
+    """
+    detectXors(clauses, max_size) -> [(mask, parity)]
+
+    Finds the xor constraints x1 ^ x2 ^ ... ^ xk = parity encoded in CNF.
+    Such a constraint is encoded by the 2^(k-1) clauses over x1..xk that
+    have an even (parity = 1) or odd (parity = 0) number of negative
+    literals: each clause forbids one assignment with the wrong parity.
+
+    Every xor is returned as a bitmask with the bit v set for every
+    variable v of the constraint, together with its parity. Only
+    constraints of at most max_size variables are looked for
+    """
+    # Clauses by set of variables and number of negative literals mod 2
+    candidates = collections.defaultdict(lambda: [set(), set()])
+
+    for clause in clauses:
+        if len(clause) < 2 or len(clause) > max_size:
+            continue
+
+        variables = frozenset(abs(l) for l in clause)
+        if len(variables) != len(clause):
+            continue
+
+        negatives = sum(1 for l in clause if l < 0)
+        candidates[variables][negatives % 2].add(clause)
+
+    xors = []
+    for variables, by_parity in candidates.iteritems():
+        mask = 0
+        for v in variables:
+            mask |= 1 << v
+
+        for negatives, found in enumerate(by_parity):
+            if len(found) == 1 << (len(variables) - 1):
+                xors.append((mask, 1 - negatives))
+
+    return xors
+
+#
+#
+def gaussianElimination(xors, variables, interpretation):
+    """
+    gaussianElimination(xors, variables, interpretation) -> [literal] | None
+
+    Simplifies the xor constraints with the current assignment and reduces
+    them to reduced row echelon form over GF(2). Rows are bit-packed in
+    integers, so adding two rows is a single xor.
+
+    Returns None if a row reduces to 0 = 1, otherwise the list of literals
+    implied by the rows with only one unassigned variable
+    """
+    free = 0
+    for v in variables:
+        free |= 1 << v
+
+    # pivot bit -> [mask, parity]
+    pivots = {}
+
+    for mask, parity in xors:
+        # Move the assigned variables to the parity
+        assigned = mask & ~free
+        if assigned:
+            for v in bitIndices(assigned):
+                if interpretation[v]:
+                    parity ^= 1
+            mask &= free
+
+        # Reduce the row with the current pivots
+        for pivot, row in pivots.iteritems():
+            if mask & pivot:
+                mask ^= row[0]
+                parity ^= row[1]
+
+        if not mask:
+            if parity:
+                return None
+            continue
+
+        # Eliminate the new pivot from the other rows
+        pivot = mask & -mask
+        for row in pivots.itervalues():
+            if row[0] & pivot:
+                row[0] ^= mask
+                row[1] ^= parity
+
+        pivots[pivot] = [mask, parity]
+
+    implied = []
+    for pivot, (mask, parity) in pivots.iteritems():
+        if mask == pivot:
+            v = pivot.bit_length() - 1
+            implied.append(v if parity else -v)
+
+    return implied
+
+#
+#
+def bitIndices(mask):
+    """
+    Returns the positions of the bits set in mask
+    """
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices